@@ -2,29 +2,65 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+# Keep this list light: every worker and every `flask` command pays for it
+# on startup. Modules only some requests or commands need (babel, dateutil,
+# WTForms and forms.py, Flask-Migrate, Flask-Moment, csv) are imported where
+# they are used; `python bench_startup.py --check` enforces this.
+import hashlib
+import io
+import os
 import json
-import dateutil.parser
-from datetime import datetime
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, make_response, jsonify
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+import base64
+import time
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta, timezone
+import functools
+import heapq
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, make_response, jsonify, session, abort, stream_with_context, current_app
+from flask.cli import AppGroup
+import click
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import FlaskForm
-from forms import *
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import is_resource_modified
+from werkzeug.local import LocalProxy
+from config import get_config
+from cache import make_cache
+from metrics import init_metrics
+from replicas import RoutingSQLAlchemy
+from assets import init_assets
+from templating import init_templating
+import geo
 
 
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+# Extensions and routes are declared here and bound to each app built by
+# create_app() (see App factory, below).
+db = RoutingSQLAlchemy()
+
+class Views(object):
+  # Collects routes at import time; create_app() adds them to every app it
+  # builds, under the same endpoint names as app.route() would.
+
+  def __init__(self):
+    self.rules = []
+
+  def route(self, rule, **options):
+    def decorator(view):
+      self.rules.append((rule, view, options))
+      return view
+    return decorator
+
+  def init_app(self, app):
+    for rule, view, options in self.rules:
+      app.add_url_rule(rule, view.__name__, view, **options)
+
+views = Views()
 
 # TODO: connect to a local postgresql database
 
@@ -32,16 +68,23 @@ migrate = Migrate(app, db)
 # Models.
 #----------------------------------------------------------------------------#
 
+# The primary keys serve "genres of a venue/artist"; the (genre_id, ...)
+# indexes serve the genre facet, "venues/artists with a genre".
 venue_genres = db.Table('venue_genres',
   db.Column('venue_id', db.Integer, db.ForeignKey('venues.id'), primary_key=True),
-  db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True)
+  db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True),
+  db.Index('ix_venue_genres_genre_id_venue_id', 'genre_id', 'venue_id')
 )
 
 artist_genres = db.Table('artist_genres',
   db.Column('artist_id', db.Integer, db.ForeignKey('artists.id'), primary_key=True),
-  db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True)
+  db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True),
+  db.Index('ix_artist_genres_genre_id_artist_id', 'genre_id', 'artist_id')
 )
 
+def utcnow():
+  return datetime.now(timezone.utc)
+
 class Venue(db.Model):
   __tablename__ = 'venues'
 
@@ -56,9 +99,22 @@ class Venue(db.Model):
   website = db.Column(db.String(120))
   seeking_talent = db.Column(db.Boolean, default=False)
   seeking_description = db.Column(db.String(120))
+  # Maintained with the shows table; see adjust_show_counts().
+  upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  updated_at = db.Column(db.DateTime(timezone=True), nullable=False, default=utcnow, onupdate=utcnow, server_default=db.func.now())
+  # Set by venue_location(); the geohash is the proximity search index.
+  latitude = db.Column(db.Float)
+  longitude = db.Column(db.Float)
+  geohash = db.Column(db.String(12), index=True)
   genres = db.relationship('Genre', secondary=venue_genres, backref=db.backref('venues', lazy=True))
   shows = db.relationship('Show', backref = 'venues')
 
+  # State/city facets, and the (state, city, id) order of the listing.
+  __table_args__ = (
+    db.Index('ix_venues_state_city_id', 'state', 'city', 'id'),
+  )
+
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
 class Artist(db.Model):
@@ -76,9 +132,20 @@ class Artist(db.Model):
   seeking_venue = db.Column(db.Boolean, default=False)
   seeking_description = db.Column(db.String(120))
   available_time = db.Column(db.String(120))
+  # available_time parsed to minutes after midnight (local time); a window
+  # with available_from > available_until runs past midnight.
+  available_from = db.Column(db.Integer)
+  available_until = db.Column(db.Integer)
+  upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  updated_at = db.Column(db.DateTime(timezone=True), nullable=False, default=utcnow, onupdate=utcnow, server_default=db.func.now())
   genres = db.relationship('Genre', secondary=artist_genres, backref=db.backref('artists', lazy=True))
   shows = db.relationship('Show', backref = 'artists')
 
+  __table_args__ = (
+    db.Index('ix_artists_state_city', 'state', 'city'),
+  )
+
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
 
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
@@ -89,53 +156,787 @@ class Show(db.Model):
   id = db.Column(db.Integer, primary_key=True)
   artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False)
   venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'), nullable=False)
-  start_time = db.Column(db.String(50), nullable=False)
+  start_time = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
+  end_time = db.Column(db.DateTime(timezone=True), nullable=False)
+  # Which venue/artist counter the show is counted in. Flipped to False by
+  # `flask shows rollover` once start_time has passed.
+  upcoming = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+  updated_at = db.Column(db.DateTime(timezone=True), nullable=False, default=utcnow, onupdate=utcnow, server_default=db.func.now())
+
+  # On Postgres the shows_venue_no_overlap / shows_artist_no_overlap exclusion
+  # constraints (see migrations) also reject overlapping bookings.
+  __table_args__ = (
+    db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_shows_upcoming_start_time', 'upcoming', 'start_time'),
+  )
 
 
 class Genre(db.Model):
   __tablename__ = 'genres'
   
   id = db.Column(db.Integer, primary_key=True)
-  name = db.Column(db.String())
+  name = db.Column(db.String(), index=True, unique=True)
+
+
+def is_upcoming():
+  # Evaluated by the database so listings can be split with an index scan.
+  return Show.start_time >= db.func.now()
+
+def detail_shows(key, entity_id, other):
+  # Past (latest first) and upcoming shows of one venue/artist, with the
+  # other side's name and image, from a single joined statement.
+  prefix = 'artist' if other is Artist else 'venue'
+  rows = db.session.query(
+    Show.start_time, other.id.label('other_id'), other.name.label('other_name'),
+    other.image_link.label('other_image_link'), is_upcoming().label('upcoming')
+  ).join(other, other.id == (Show.artist_id if other is Artist else Show.venue_id)) \
+    .filter(key == entity_id).order_by(Show.start_time, Show.id)
+  past, upcoming = [], []
+  for row in rows:
+    (upcoming if row.upcoming else past).append({
+      prefix + "_id": row.other_id,
+      prefix + "_name": row.other_name,
+      prefix + "_image_link": row.other_image_link,
+      "start_time": row.start_time
+    })
+  past.reverse()
+  return past, upcoming
+
+def availability(available_time):
+  # (available_from, available_until) for an artist's available_time.
+  from forms import parse_time_range
+  return (available_time and parse_time_range(available_time)) or (None, None)
+
+def is_available(available_from, available_until, minute):
+  if available_from is None:
+    return True
+  if available_from < available_until:
+    return available_from <= minute <= available_until
+  return minute >= available_from or minute <= available_until
+
+def booking_conflicts(start, end, venue_ids, artist_ids):
+  # Shows overlapping [start, end) at any of the venues or for any of the
+  # artists. No show is longer than MAX_SHOW_MINUTES, which bounds both
+  # (venue_id|artist_id, start_time) index scans to a narrow window.
+  from forms import MAX_SHOW_MINUTES
+  return Show.query.filter(
+    or_(Show.venue_id.in_(venue_ids), Show.artist_id.in_(artist_ids)),
+    Show.start_time > start - timedelta(minutes=MAX_SHOW_MINUTES),
+    Show.start_time < end,
+    Show.end_time > start
+  )
+
+def adjust_show_counts(shows, delta):
+  # Add delta to the venue and artist counters of each (venue_id, artist_id,
+  # upcoming) show, in the caller's transaction. Entities getting the same
+  # change share one UPDATE.
+  changes = Counter()
+  for venue_id, artist_id, upcoming in shows:
+    column = 'upcoming_shows_count' if upcoming else 'past_shows_count'
+    changes[(Venue, column, venue_id)] += delta
+    changes[(Artist, column, artist_id)] += delta
+  groups = {}
+  for (model, column, entity_id), change in changes.items():
+    if change:
+      groups.setdefault((model, column, change), []).append(entity_id)
+  for (model, column, change), ids in groups.items():
+    counter = getattr(model, column)
+    db.session.query(model).filter(model.id.in_(ids)).update({counter: counter + change}, synchronize_session=False)
+
+def show_count_drift(model):
+  # (id, stored upcoming, stored past, actual upcoming, actual past) for each
+  # venue/artist whose counters disagree with its shows.
+  key = Show.venue_id if model is Venue else Show.artist_id
+  counts = db.session.query(
+    key.label('id'),
+    db.func.sum(db.case([(Show.upcoming, 1)], else_=0)).label('upcoming'),
+    db.func.sum(db.case([(Show.upcoming, 0)], else_=1)).label('past')
+  ).group_by(key).subquery()
+  upcoming = db.func.coalesce(counts.c.upcoming, 0)
+  past = db.func.coalesce(counts.c.past, 0)
+  return db.session.query(model.id, model.upcoming_shows_count, model.past_shows_count, upcoming, past) \
+    .outerjoin(counts, counts.c.id == model.id) \
+    .filter(or_(model.upcoming_shows_count != upcoming, model.past_shows_count != past)) \
+    .order_by(model.id).all()
+
+def misflagged_shows():
+  # Shows counted as past that haven't started. Rollover only moves shows the
+  # other way, so these come from edits outside the app.
+  return Show.query.filter(Show.upcoming == False, is_upcoming())
+
+def repair_show_counts():
+  misflagged_shows().update({Show.upcoming: True}, synchronize_session=False)
+  repaired = 0
+  for model in (Venue, Artist):
+    for entity_id, stored_upcoming, stored_past, upcoming, past in show_count_drift(model):
+      db.session.query(model).filter(model.id == entity_id) \
+        .update({model.upcoming_shows_count: upcoming, model.past_shows_count: past}, synchronize_session=False)
+      repaired += 1
+  return repaired
+
+
+# Process-local genre name -> id registry. Genres are only ever added, so a
+# cached id stays valid; entries made in a transaction that later rolls back
+# are dropped with clear_genre_registry().
+genre_registry = {}
+
+def clear_genre_registry():
+  genre_registry.clear()
+
+def resolve_genre_ids(names):
+  names = set(names)
+  missing = [name for name in names if name not in genre_registry]
+  if missing:
+    table = Genre.__table__
+    if db.session.get_bind().dialect.name == 'postgresql':
+      # Upsert and read back every id in one statement.
+      from sqlalchemy.dialects import postgresql
+      stmt = postgresql.insert(table).values([{"name": name} for name in missing])
+      stmt = stmt.on_conflict_do_update(index_elements=[table.c.name], set_={"name": stmt.excluded.name})
+      rows = db.session.execute(stmt.returning(table.c.id, table.c.name)).fetchall()
+    else:
+      db.session.execute(table.insert().prefix_with('OR IGNORE'), [{"name": name} for name in missing])
+      rows = db.session.execute(db.select([table.c.id, table.c.name]).where(table.c.name.in_(missing))).fetchall()
+    genre_registry.update({row.name: row.id for row in rows})
+  return {genre_registry[name] for name in names}
+
+def sync_genres(table, key, entity_id, names, current=None):
+  # Diff the association rows of one venue/artist against the submitted
+  # genres, touching only the rows that changed.
+  column = table.c[key]
+  wanted = resolve_genre_ids(names)
+  if current is None:
+    current = {row.genre_id for row in db.session.execute(db.select([table.c.genre_id]).where(column == entity_id))}
+  removed = current - wanted
+  added = wanted - current
+  if removed:
+    db.session.execute(table.delete().where(and_(column == entity_id, table.c.genre_id.in_(removed))))
+  if added:
+    db.session.execute(table.insert(), [{key: entity_id, "genre_id": genre_id} for genre_id in added])
 
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en_US')
+# Patterns and locale are parsed once, on first use; formatted strings are
+# memoized since listing pages format the same handful of timestamps over
+# and over.
+DATETIME_PATTERNS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+
+@functools.lru_cache(maxsize=None)
+def datetime_pattern(format):
+  import babel.dates
+  return babel.dates.parse_pattern(DATETIME_PATTERNS.get(format, format))
+
+@functools.lru_cache(maxsize=1)
+def datetime_locale():
+  import babel
+  return babel.Locale.parse('en_US')
+
+@functools.lru_cache(maxsize=4096)
+def format_datetime(value, format='medium'):
+  if not isinstance(value, datetime):
+    import dateutil.parser
+    value = dateutil.parser.parse(value)
+  if value.tzinfo is None:
+    value = value.replace(tzinfo=timezone.utc)
+  # Shows are stored in UTC but entered in the server's local time; show
+  # them in that zone too.
+  return datetime_pattern(format).apply(value.astimezone(), datetime_locale())
+
+def format_datetimes(values, format='medium'):
+  # Format a page of timestamps in one pass, once per distinct value.
+  formatted = {value: format_datetime(value, format) for value in set(values)}
+  return [formatted[value] for value in values]
+
+#----------------------------------------------------------------------------#
+# Pagination.
+#----------------------------------------------------------------------------#
+
+# Listings are paged by keyset: a page is "the next N rows after this sort key",
+# so links stay stable when rows are inserted and no OFFSET scan is needed.
+Page = namedtuple('Page', ['items', 'prev_cursor', 'next_cursor'])
+
+def encode_cursor(values):
+  raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+  return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor, columns):
+  try:
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+  except (ValueError, TypeError):
+    return None
+  if not isinstance(values, list) or len(values) != len(columns):
+    return None
+  try:
+    return [datetime.fromisoformat(v) if isinstance(c.type, db.DateTime) else v for c, v in zip(columns, values)]
+  except (ValueError, TypeError):
+    return None
+
+def keyset_filter(columns, values, forward):
+  # (a, b, c) > (x, y, z) spelled out, since not every backend has row values.
+  clauses = []
+  for i, column in enumerate(columns):
+    bound = column > values[i] if forward else column < values[i]
+    clauses.append(and_(*[columns[j] == values[j] for j in range(i)], bound))
+  return or_(*clauses)
+
+def page_size():
+  size = request.args.get('limit', current_app.config['PAGE_SIZE'], type=int)
+  return max(1, min(size, current_app.config['MAX_PAGE_SIZE']))
+
+def paginate(query, columns, start=None):
+  # `columns` is the unique sort key; every selected row must expose each of
+  # them as an attribute. `start` positions the first page when no cursor is
+  # given (e.g. "from now on" for shows).
+  size = page_size()
+  after = request.args.get('after')
+  before = request.args.get('before')
+  values = decode_cursor(before or after or '', columns)
+
+  if values and before:
+    rows = query.filter(keyset_filter(columns, values, False)).order_by(*[c.desc() for c in columns]).limit(size + 1).all()
+    has_more = len(rows) > size
+    rows = rows[:size][::-1]
+    has_prev, has_next = has_more, True
+  else:
+    unbounded = query
+    if values:
+      query = query.filter(keyset_filter(columns, values, True))
+    elif start is not None:
+      query = query.filter(start)
+    rows = query.order_by(*columns).limit(size + 1).all()
+    has_more = len(rows) > size
+    rows = rows[:size]
+    has_prev, has_next = bool(values) or start is not None, has_more
+    if not rows and not values and start is not None:
+      # Nothing from `start` on (e.g. no upcoming shows): open on the last
+      # page before it, so the earlier rows stay reachable.
+      rows = unbounded.filter(~start).order_by(*[c.desc() for c in columns]).limit(size + 1).all()
+      has_prev, has_next = len(rows) > size, False
+      rows = rows[:size][::-1]
+
+  def key(row):
+    return encode_cursor([getattr(row, c.key) for c in columns])
+
+  return Page(
+    items=rows,
+    prev_cursor=key(rows[0]) if rows and has_prev else None,
+    next_cursor=key(rows[-1]) if rows and has_next else None
+  )
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Venues and artists are searched by name and by "city, state" in a single
+# ranked, capped statement. Postgres uses the pg_trgm indexes on lower(name)
+# and lower(city || ', ' || state); SQLite uses the <table>_search FTS5
+# trigram tables. Both are created by migration.
+
+def search_area(model):
+  return db.func.lower(model.city + ', ' + model.state)
+
+def escape_like(term):
+  return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search_results(model, term):
+  term = term.strip().lower()
+  if not term:
+    # A blank term would match every row.
+    return [{"count": 0, "data": []}, {"count": 0, "data": []}]
+  pattern = '%' + escape_like(term) + '%'
+  name_hit = db.func.lower(model.name).like(pattern, escape='\\')
+  area_hit = search_area(model).like(pattern, escape='\\')
+  query = db.session.query(
+    model.id, model.name, model.city, model.state,
+    name_hit.label('by_name'), area_hit.label('by_area')
+  )
+
+  dialect = db.session.get_bind().dialect.name
+  if dialect == 'postgresql':
+    rank = db.func.greatest(
+      db.func.similarity(db.func.lower(model.name), term),
+      db.func.similarity(search_area(model), term)
+    )
+    query = query.filter(or_(name_hit, area_hit)).order_by(rank.desc(), model.id)
+  elif dialect == 'sqlite' and len(term) >= 3:
+    # The trigram tokenizer only indexes substrings of three or more characters.
+    fts = db.table(model.__tablename__ + '_search', db.column('rowid'), db.column('rank'))
+    query = query.join(fts, fts.c.rowid == model.id) \
+      .filter(db.text(fts.name + ' MATCH :phrase').bindparams(phrase='"' + term.replace('"', '""') + '"')) \
+      .order_by(fts.c.rank, model.id)
+  else:
+    query = query.filter(or_(name_hit, area_hit)).order_by(model.name, model.id)
+
+  by_name = {"count": 0, "data": []}
+  by_area = {"count": 0, "data": []}
+  for row in query.limit(current_app.config['SEARCH_RESULT_LIMIT']):
+    if row.by_name:
+      by_name["data"].append({"id": row.id, "name": row.name})
+    if row.by_area:
+      by_area["data"].append({"id": row.id, "name": row.name, "state": row.state, "city": row.city})
+  by_name["count"] = len(by_name["data"])
+  by_area["count"] = len(by_area["data"])
+  return [by_name, by_area]
+
+#----------------------------------------------------------------------------#
+# Facets.
+#----------------------------------------------------------------------------#
+
+# /venues and /artists can be narrowed by ?state=, ?city=, ?genre= and
+# ?seeking=yes|no. Each facet lists its values with the number of matches
+# under the other active filters, so picking a value shows what it would
+# leave; all counts come from one UNION ALL of grouped selects.
+
+FACETS = ('state', 'city', 'genre', 'seeking')
+FACET_LIMIT = 25
+
+def facet_source(model):
+  # (association table, its entity id column, seeking flag) for a model.
+  if model is Venue:
+    return venue_genres, venue_genres.c.venue_id, Venue.seeking_talent
+  return artist_genres, artist_genres.c.artist_id, Artist.seeking_venue
+
+def facet_params():
+  # Active filters from the query string; states outside the form's choices
+  # and unknown seeking values are ignored.
+  from forms import VenueForm
+  params = {}
+  for name in ('state', 'city', 'genre'):
+    value = request.args.get(name, '').strip()
+    if value:
+      params[name] = value
+  if params.get('state') not in {value for value, label in VenueForm.state.kwargs['choices']}:
+    params.pop('state', None)
+  if request.args.get('seeking') in ('yes', 'no'):
+    params['seeking'] = request.args['seeking']
+  return params
+
+def seeking_value(flag):
+  return db.case([(flag == True, 'yes')], else_='no')
+
+def facet_filters(model, params, skip=None):
+  association, key, flag = facet_source(model)
+  clauses = []
+  for name, value in params.items():
+    if name == skip:
+      continue
+    if name == 'state':
+      clauses.append(model.state == value)
+    elif name == 'city':
+      clauses.append(model.city == value)
+    elif name == 'seeking':
+      clauses.append(seeking_value(flag) == value)
+    elif name == 'genre':
+      genre_id = db.select([Genre.id]).where(Genre.name == value).as_scalar()
+      clauses.append(model.id.in_(db.select([key]).where(association.c.genre_id == genre_id)))
+  return clauses
+
+def facet_counts(model, params):
+  # {facet: [(value, count), ...]}, most common first.
+  association, key, flag = facet_source(model)
+  def grouped(name, value, source, count):
+    return db.select([db.literal(name).label('facet'), value.label('value'), count.label('count')]) \
+      .select_from(source).where(and_(value.isnot(None), *facet_filters(model, params, skip=name))).group_by(value)
+  table = model.__table__
+  genres = table.join(association, key == model.id).join(Genre.__table__, Genre.id == association.c.genre_id)
+  selects = [
+    grouped('state', model.state, table, db.func.count(model.id)),
+    grouped('city', model.city, table, db.func.count(model.id)),
+    grouped('genre', Genre.name, genres, db.func.count(model.id)),
+    grouped('seeking', seeking_value(flag), table, db.func.count(model.id)),
+  ]
+  counts = {name: [] for name in FACETS}
+  for row in db.session.execute(db.union_all(*selects)):
+    counts[row.facet].append((row.value, row.count))
+  for values in counts.values():
+    values.sort(key=lambda item: (-item[1], item[0]))
+  return counts
+
+def facet_links(model, params):
+  # Facet values for the template, with links that select or clear them.
+  facets = []
+  for name, values in sorted(facet_counts(model, params).items(), key=lambda item: FACETS.index(item[0])):
+    active = params.get(name)
+    shown = values[:FACET_LIMIT]
+    if active and active not in [value for value, count in shown]:
+      shown.append((active, dict(values).get(active, 0)))
+    items = []
+    for value, count in shown:
+      toggled = dict(params)
+      if value == active:
+        toggled.pop(name)
+      else:
+        toggled[name] = value
+      items.append({"value": value, "count": count, "active": value == active, "url": url_for(request.endpoint, **toggled)})
+    facets.append({"name": name, "options": items})
+  return facets
+
+#----------------------------------------------------------------------------#
+# Proximity.
+#----------------------------------------------------------------------------#
+
+# Venues are placed from the coordinates given on the venue form, or else
+# from the bundled city/state table in geo.py, and store the geohash of that
+# point. /venues/near reads only the venues in the few geohash ranges that
+# cover its bounding box, then ranks them by exact distance.
+
+def venue_location(city, state, latitude=None, longitude=None):
+  # Venue column values for a position; all None when it can't be placed.
+  if latitude is None or longitude is None:
+    latitude, longitude = geo.locate(city, state) or (None, None)
+  if latitude is None:
+    return {'latitude': None, 'longitude': None, 'geohash': None}
+  return {'latitude': latitude, 'longitude': longitude, 'geohash': geo.encode(latitude, longitude)}
+
+def near_params():
+  # (latitude, longitude, radius in km, k) from ?lat=&lng=&radius=&k=.
+  # Raises ValueError with a message for the user on bad input.
+  config = current_app.config
+  try:
+    latitude, longitude = float(request.args['lat']), float(request.args['lng'])
+  except (KeyError, ValueError):
+    raise ValueError('Enter a latitude and a longitude in decimal degrees.')
+  if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+    raise ValueError('Latitude must be between -90 and 90 and longitude between -180 and 180.')
+  try:
+    radius = float(request.args.get('radius') or config['NEAR_RADIUS_KM'])
+    k = int(request.args.get('k') or config['NEAR_LIMIT'])
+  except ValueError:
+    raise ValueError('The radius and the number of venues must be numbers.')
+  if not 0 < radius <= config['NEAR_MAX_RADIUS_KM']:
+    raise ValueError('The radius must be above 0 and at most %d km.' % config['NEAR_MAX_RADIUS_KM'])
+  if not 0 < k <= config['NEAR_MAX_LIMIT']:
+    raise ValueError('Ask for between 1 and %d venues.' % config['NEAR_MAX_LIMIT'])
+  return latitude, longitude, radius, k
+
+def nearest_venues(latitude, longitude, radius, k):
+  # The k venues closest to the point within radius km, nearest first. One
+  # statement: geohash ranges prune by index, the box check drops the corners
+  # of the covering cells, and haversine() decides the rest.
+  box = geo.bounding_box(latitude, longitude, radius)
+  south, west, north, east = box
+  ranges = [
+    Venue.geohash >= start if end is None else and_(Venue.geohash >= start, Venue.geohash < end)
+    for start, end in geo.covering_ranges(box)
+  ]
+  rows = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.address, Venue.latitude, Venue.longitude) \
+    .filter(or_(*ranges), Venue.latitude.between(south, north), Venue.longitude.between(west, east))
+  found = []
+  for venue in rows:
+    distance = geo.haversine(latitude, longitude, venue.latitude, venue.longitude)
+    if distance <= radius:
+      found.append((distance, venue.id, venue))
+  return [
+    {
+      "id": venue.id,
+      "name": venue.name,
+      "city": venue.city,
+      "state": venue.state,
+      "address": venue.address,
+      "distance_km": distance
+    }
+    for distance, venue_id, venue in heapq.nsmallest(k, found, key=lambda item: item[:2])
+  ]
+
+#----------------------------------------------------------------------------#
+# Detail page cache.
+#----------------------------------------------------------------------------#
+
+# Rendered venue/artist pages, keyed "venue:<id>" / "artist:<id>", stored
+# with the ETag they were rendered under. An entry is served only while that
+# ETag still matches the one computed from the database, so a write made by
+# another worker or the CLI (which can only clear its own process's LRU)
+# is never answered with a stale page. Pages with pending flash messages are
+# neither served from nor written to the cache.
+detail_cache = LocalProxy(lambda: current_app.extensions['detail_cache'])
+
+def detail_ttl(upcoming_shows):
+  # An entry must expire by the time its next upcoming show starts, since
+  # that show then has to move to the "past" section.
+  ttl = current_app.config['CACHE_DEFAULT_TTL']
+  if upcoming_shows:
+    start = upcoming_shows[0]["start_time"]
+    if start.tzinfo is None:
+      start = start.replace(tzinfo=timezone.utc)
+    ttl = min(ttl, (start - datetime.now(timezone.utc)).total_seconds())
+  return ttl
+
+def invalidate_detail_pages(venue_ids=(), artist_ids=()):
+  keys = ['venue:%s' % venue_id for venue_id in venue_ids] + ['artist:%s' % artist_id for artist_id in artist_ids]
+  detail_cache.delete(*keys)
+
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+# Listing and detail pages carry a strong ETag derived from one aggregate
+# query (row count, latest updated_at) over the rows they show, so a
+# revalidating client gets a 304 before anything is assembled or rendered.
+# A hash of the templates is mixed in, so a deploy that changes the markup
+# also changes every ETag. There is no Last-Modified: deleting a row changes
+# the count but leaves the latest updated_at where it was, so an
+# If-Modified-Since check would answer 304 for a page that lost a row.
+
+def page_validators(*values, version=None):
+  # The ETag of a page determined by `values`. `version` replaces the
+  # template hash for responses that aren't rendered from templates.
+  version = version or current_app.extensions['template_version']
+  return hashlib.sha1(repr((version,) + values).encode('utf-8')).hexdigest()
+
+def started_show_time():
+  # Latest start time among shows that have started: it moves whenever a
+  # show goes from upcoming to past, which changes the pages listing both.
+  return db.func.max(db.case([(~is_upcoming(), Show.start_time)]))
+
+def table_validators(model):
+  return page_validators(model.__tablename__, *db.session.query(db.func.count(model.id), db.func.max(model.updated_at)).one())
+
+def shows_validators(conditions=()):
+  # `conditions` narrow the shows counted, for a ?from=/?to= range.
+  return page_validators('shows', *db.session.query(
+    db.func.count(Show.id), db.func.max(Show.updated_at), started_show_time(),
+    db.session.query(db.func.max(Venue.updated_at)).as_scalar(),
+    db.session.query(db.func.max(Artist.updated_at)).as_scalar()
+  ).filter(*conditions).one())
+
+def entity_state(model, entity_id, columns, conditions=()):
+  # The entity's updated_at, the count and latest updated_at of its shows
+  # (those matching `conditions`) and the latest updated_at of the
+  # artists/venues of those shows, then `columns`, in one aggregate row.
+  # None if the entity doesn't exist.
+  if model is Venue:
+    key, other, other_key = Show.venue_id, Artist, Show.artist_id
+  else:
+    key, other, other_key = Show.artist_id, Venue, Show.venue_id
+  return db.session.query(
+    model.updated_at, db.func.count(Show.id), db.func.max(Show.updated_at),
+    db.func.max(other.updated_at), *columns
+  ).outerjoin(Show, and_(key == model.id, *conditions)).outerjoin(other, other.id == other_key) \
+    .filter(model.id == entity_id).group_by(model.id, model.updated_at).first()
+
+def detail_validators(model, entity_id):
+  # A venue/artist page shows the entity, its shows and the artists/venues
+  # of those shows. None if the entity doesn't exist.
+  row = entity_state(model, entity_id, [started_show_time()])
+  return page_validators(model.__tablename__, entity_id, *row) if row else None
+
+def not_modified(validators):
+  # A 304 if the client's copy is current. Views pass no validators while
+  # flash messages are pending: that page differs from the one they describe.
+  if validators is None:
+    return None
+  if is_resource_modified(request.environ, etag=validators):
+    return None
+  return with_validators(Response(status=304), validators)
+
+def with_validators(body, validators):
+  response = make_response(body)
+  if validators is not None:
+    response.set_etag(validators)
+    response.cache_control.no_cache = True
+  return response
+
+#----------------------------------------------------------------------------#
+# Show ranges and calendars.
+#----------------------------------------------------------------------------#
+
+# /shows and the venue/artist calendar feeds take ?from= and ?to=, ISO 8601
+# dates or times; times without an offset are server local, like the show
+# form. The range is half-open on start_time and served by its index; a
+# bare date for ?to= includes that day.
+#
+# Feeds are iCalendar, written event by event from a server-side cursor.
+# Calendar apps poll them, so their validators cover only what a feed shows
+# (the venue/artist, its shows and the names on the other side of them), not
+# the templates or the clock, and an unchanged feed costs one aggregate
+# query and a 304. Bump CALENDAR_VERSION when the feed's format changes.
+
+CALENDAR_VERSION = 'calendar-1'
+
+def show_time_param(name):
+  value = request.args.get(name)
+  if not value:
+    return None
+  try:
+    parsed = datetime.fromisoformat(value)
+  except ValueError:
+    raise ValueError('%s must be a date (YYYY-MM-DD) or a date and time (YYYY-MM-DDTHH:MM).' % name.capitalize())
+  if name == 'to' and len(value) == len('YYYY-MM-DD'):
+    parsed += timedelta(days=1)
+  return parsed.astimezone(timezone.utc)
+
+def show_range():
+  # Show.start_time conditions for ?from= and ?to=. Raises ValueError with a
+  # message for the user on bad input.
+  start, end = show_time_param('from'), show_time_param('to')
+  if start and end and start >= end:
+    raise ValueError('From must be before to.')
+  conditions = []
+  if start:
+    conditions.append(Show.start_time >= start)
+  if end:
+    conditions.append(Show.start_time < end)
+  return conditions
+
+def range_params():
+  return {name: request.args[name] for name in ('from', 'to') if request.args.get(name)}
+
+def calendar_validators(model, entity_id, conditions):
+  row = entity_state(model, entity_id, [], conditions)
+  return page_validators(model.__tablename__, entity_id, *row, version=CALENDAR_VERSION) if row else None
+
+def ics_text(value):
+  return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+def ics_time(value):
+  # Stored times are UTC; SQLite hands them back naive.
+  if value.tzinfo:
+    value = value.astimezone(timezone.utc)
+  return value.strftime('%Y%m%dT%H%M%SZ')
+
+def ics_lines(*lines):
+  # "NAME:value" content lines, folded at 75 octets without splitting a
+  # UTF-8 sequence.
+  folded = []
+  for name, value in lines:
+    line = ('%s:%s' % (name, value)).encode('utf-8')
+    parts = []
+    while len(line) > 75:
+      cut = 75 if not parts else 74
+      while (line[cut] & 0xC0) == 0x80:
+        cut -= 1
+      parts.append(line[:cut])
+      line = line[cut:]
+    parts.append(line)
+    folded.append(b'\r\n '.join(parts).decode('utf-8') + '\r\n')
+  return ''.join(folded)
+
+def ics_event(show, host, root):
+  location = ', '.join(part for part in (show.venue_name, show.address, show.city, show.state) if part)
+  lines = [
+    ('BEGIN', 'VEVENT'),
+    ('UID', 'show-%d@%s' % (show.id, host)),
+    # The show's own timestamp, so an unchanged show is written identically.
+    ('DTSTAMP', ics_time(show.updated_at)),
+    ('LAST-MODIFIED', ics_time(show.updated_at)),
+    ('DTSTART', ics_time(show.start_time)),
+    ('DTEND', ics_time(show.end_time)),
+    ('SUMMARY', ics_text('%s at %s' % (show.artist_name, show.venue_name))),
+    ('LOCATION', ics_text(location)),
+    ('URL', '%sartists/%d' % (root, show.artist_id)),
+  ]
+  if show.latitude is not None and show.longitude is not None:
+    lines.append(('GEO', '%.6f;%.6f' % (show.latitude, show.longitude)))
+  lines.append(('END', 'VEVENT'))
+  return ics_lines(*lines)
+
+def calendar_caching(response):
+  # Feeds may be reused for CALENDAR_MAX_AGE before clients revalidate.
+  response.cache_control.no_cache = None
+  response.cache_control.public = True
+  response.cache_control.max_age = current_app.config['CALENDAR_MAX_AGE']
+  return response
+
+def calendar_feed(model, entity_id):
+  try:
+    conditions = show_range()
+  except ValueError as error:
+    return Response(str(error) + '\n', status=400, mimetype='text/plain')
+  validators = calendar_validators(model, entity_id, conditions)
+  if validators is None:
+    abort(404)
+  response = not_modified(validators)
+  if response:
+    return calendar_caching(response)
+
+  name = db.session.query(model.name).filter(model.id == entity_id).scalar()
+  key = Show.venue_id if model is Venue else Show.artist_id
+  shows = db.session.query(
+    Show.id, Show.start_time, Show.end_time, Show.updated_at, Show.artist_id,
+    Artist.name.label('artist_name'), Venue.name.label('venue_name'), Venue.address,
+    Venue.city, Venue.state, Venue.latitude, Venue.longitude
+  ).join(Venue, Venue.id == Show.venue_id).join(Artist, Artist.id == Show.artist_id) \
+    .filter(key == entity_id, *conditions).order_by(Show.start_time, Show.id) \
+    .yield_per(current_app.config['API_STREAM_BATCH'])
+
+  def generate():
+    yield ics_lines(
+      ('BEGIN', 'VCALENDAR'),
+      ('VERSION', '2.0'),
+      ('PRODID', '-//Fyyur//Shows//EN'),
+      ('CALSCALE', 'GREGORIAN'),
+      ('METHOD', 'PUBLISH'),
+      ('X-WR-CALNAME', ics_text('%s - Fyyur shows' % name))
+    )
+    for show in shows:
+      yield ics_event(show, request.host, request.url_root)
+    yield ics_lines(('END', 'VCALENDAR'))
 
-app.jinja_env.filters['datetime'] = format_datetime
+  response = Response(stream_with_context(generate()), mimetype='text/calendar')
+  return calendar_caching(with_validators(response, validators))
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
-@app.route('/')
+#  Recently listed
+#  ----------------------------------------------------------------
+
+# The home page block is tiny and read on every visit, so keep it in process.
+# Writes in this worker clear it; the TTL bounds staleness across workers.
+recently_listed_cache = {}
+
+def recently_listed():
+  ttl = current_app.config['RECENTLY_LISTED_CACHE_TTL']
+  cached = recently_listed_cache.get('block')
+  if ttl and cached and cached[0] > time.monotonic():
+    return cached[1]
+
+  limit = current_app.config['RECENTLY_LISTED_LIMIT']
+  block = {
+    "artists": db.session.query(Artist.id, Artist.name).order_by(Artist.id.desc()).limit(limit).all(),
+    "venues": db.session.query(Venue.id, Venue.name).order_by(Venue.id.desc()).limit(limit).all()
+  }
+  if ttl:
+    recently_listed_cache['block'] = (time.monotonic() + ttl, block)
+  return block
+
+def invalidate_recently_listed():
+  recently_listed_cache.clear()
+
+@views.route('/')
 def index():
-  artists = Artist.query.order_by('id').all()[::-1][:10]
-  venues = Venue.query.order_by('id').all()[::-1][:10]
-  return render_template('pages/home.html', venues=venues, artists=artists)
+  block = recently_listed()
+  return render_template('pages/home.html', venues=block["venues"], artists=block["artists"])
 
 
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@views.route('/venues')
 def venues():
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  
-  venues = Venue.query.order_by('id').all()
+  validators = None if session.get('_flashes') else table_validators(Venue)
+  response = not_modified(validators)
+  if response:
+    return response
+
+  # One statement per page: venues in area order with their stored count of
+  # upcoming shows; the shows table isn't read. One more counts the facets.
+  params = facet_params()
+  query = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.upcoming_shows_count.label('num_shows'), Venue.updated_at) \
+    .filter(*facet_filters(Venue, params))
+  page = paginate(query, [Venue.state, Venue.city, Venue.id])
   data, groups = [], {}
 
-  for venue in venues:
+  for venue in page.items:
     if (venue.city, venue.state) in groups:
       groups[(venue.city, venue.state)].append(venue)
     else:
@@ -149,53 +950,54 @@ def venues():
     for venue in groups[group]:
       value["venues"].append({
         "id": venue.id,
-        "name": venue.name
+        "name": venue.name,
+        "num_upcoming_shows": venue.num_shows,
+        "updated_at": venue.updated_at
       })
     data.append(value)
 
-  return render_template('pages/venues.html', areas=data)
+  facets = facet_links(Venue, params)
+  return with_validators(render_template('pages/venues.html', areas=data, page=page, params=params, facets=facets), validators)
 
-@app.route('/venues/search', methods=['POST'])
+@views.route('/venues/search', methods=['POST'])
 def search_venues():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  keyWord = request.form.get('search_term', '').lower()
+  keyWord = request.form.get('search_term', '').strip().lower()
   if not keyWord:
     flash('Enter a search keyword')
     return render_template('pages/venues.html')
 
-  response1 = {"count": 0, "data": []}
-  venues = Venue.query.all()
-  for venue in venues:
-    if keyWord in venue.name.lower():
-      data = {
-        "id": venue.id,
-        "name": venue.name,
-      }
-      response1["data"].append(data)
-      response1["count"] +=1
-
-  response2 = {"count": 0, "data": []}
-  venues = Venue.query.all()
-  for venue in venues:
-    if keyWord in f'{venue.city.lower()}, {venue.state.lower()}':
-      data = {
-        "id": venue.id,
-        "name": venue.name,
-        "state": venue.state,
-        "city": venue.city
-      }
-      response2["data"].append(data)
-      response2["count"] +=1
-
-  return render_template('pages/search_venues.html', results=[response1, response2], search_term=request.form.get('search_term', ''))
+  return render_template('pages/search_venues.html', results=search_results(Venue, keyWord), search_term=request.form.get('search_term', ''))
 
-@app.route('/venues/<int:venue_id>')
+@views.route('/venues/near')
+def venues_near():
+  if 'lat' not in request.args and 'lng' not in request.args:
+    return render_template('pages/venues_near.html', venues=None)
+  try:
+    latitude, longitude, radius, k = near_params()
+  except ValueError as error:
+    flash(str(error))
+    return render_template('pages/venues_near.html', venues=None), 400
+  venues = nearest_venues(latitude, longitude, radius, k)
+  return render_template('pages/venues_near.html', venues=venues, radius=radius)
+
+@views.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id
 
+  key = 'venue:%d' % venue_id
+  cacheable = not session.get('_flashes')
+  validators = detail_validators(Venue, venue_id) if cacheable else None
+  response = not_modified(validators)
+  if response:
+    return response
+  cached = detail_cache.get(key) if cacheable else None
+  if cached is not None and cached[1] == validators:
+    return with_validators(cached[0], validators)
+
   venue = Venue.query.get(venue_id)
   if not venue:
     flash('Venue does not exist')
@@ -214,51 +1016,35 @@ def show_venue(venue_id):
   if venue.seeking_talent:
     data["seeking_description"] = venue.seeking_description
   data["image_link"] = venue.image_link
-  data["past_shows"] = []
-  data["upcoming_shows"] = []
-  shows = venue.shows
-  prev_shows = []
-  next_shows = []
-  for show in shows:
-    if dateutil.parser.parse(show.start_time) > datetime.now():
-      next_shows.append(show)
-    else:
-      prev_shows.append(show)
-  for show in prev_shows:
-    cur_show = {}
-    artist = Artist.query.get(show.artist_id)
-    cur_show["artist_id"] = artist.id
-    cur_show["artist_name"] = artist.name
-    cur_show["artist_image_link"] = artist.image_link
-    cur_show["start_time"] = show.start_time
-    data["past_shows"].append(cur_show)
-  for show in next_shows:
-    cur_show = {}
-    artist = Artist.query.get(show.artist_id)
-    cur_show["artist_id"] = artist.id
-    cur_show["artist_name"] = artist.name
-    cur_show["artist_image_link"] = artist.image_link
-    cur_show["start_time"] = show.start_time
-    data["upcoming_shows"].append(cur_show)
+  data["past_shows"], data["upcoming_shows"] = detail_shows(Show.venue_id, venue.id, Artist)
   
   data["past_shows_count"] = len(data["past_shows"])
   data["upcoming_shows_count"] = len(data["upcoming_shows"])
 
-  return render_template('pages/show_venue.html', venue=data)
+  html = render_template('pages/show_venue.html', venue=data)
+  if cacheable:
+    detail_cache.set(key, (html, validators), ttl=detail_ttl(data["upcoming_shows"]))
+  return with_validators(html, validators)
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@views.route('/venues/<int:venue_id>/calendar.ics')
+def venue_calendar(venue_id):
+  return calendar_feed(Venue, venue_id)
+
+@views.route('/venues/create', methods=['GET'])
 def create_venue_form():
+  from forms import VenueForm
   form = VenueForm()
   return render_template('forms/new_venue.html', form=form)
 
-@app.route('/venues/create', methods=['POST'])
+@views.route('/venues/create', methods=['POST'])
 def create_venue_submission():
   # TODO: insert form data as a new Venue record in the db, instead
   # TODO: modify data to be the data object returned from db insertion
 
+  from forms import VenueForm
   form = VenueForm()
   if not form.validate_on_submit():
     flash('One or more form fields are invalid. Please re-fill correctly.')
@@ -275,24 +1061,19 @@ def create_venue_submission():
     facebook_link = request.form.get('facebook_link')
     seeking_talent = True if request.form.get('seeking_venue') == 'YES' else False
     seeking_description = request.form.get('seeking_description')
-    new_venue = Venue(name=name, address=address, city=city, state=state, phone=phone, image_link=image_link, website=website, facebook_link=facebook_link, seeking_talent=seeking_talent, seeking_description=seeking_description)
-    genres = set(request.form.getlist('genres'))
-    for genre in genres:
-      genre_present = Genre.query.filter_by(name=genre).all()
-      if not genre_present:
-        g = Genre(name=genre)
-        db.session.add(g)
-      else:
-        g = genre_present[0]
-      g.venues.append(new_venue)
-
+    new_venue = Venue(name=name, address=address, city=city, state=state, phone=phone, image_link=image_link, website=website, facebook_link=facebook_link, seeking_talent=seeking_talent, seeking_description=seeking_description,
+      **venue_location(city, state, form.latitude.data, form.longitude.data))
     db.session.add(new_venue)
+    db.session.flush()
+    sync_genres(venue_genres, 'venue_id', new_venue.id, request.form.getlist('genres'), current=set())
     db.session.commit()
+    invalidate_recently_listed()
     # on successful db insert, flash success
     flash('Venue ' + request.form['name'] + ' was successfully listed!')
   # TODO: on unsuccessful db insert, flash an error instead.
   except:
     db.session.rollback()
+    clear_genre_registry()
     flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.')
   # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
@@ -301,17 +1082,24 @@ def create_venue_submission():
   
   return render_template('pages/home.html')
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@views.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
   # TODO: Complete this endpoint for taking a venue_id, and using
   # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
 
   try:
     venue = Venue.query.get(venue_id)
+    # The venue's shows go with it, and come off their artists' counters.
+    shows = db.session.query(Show.venue_id, Show.artist_id, Show.upcoming).filter(Show.venue_id == venue.id).all()
+    artist_ids = list({show.artist_id for show in shows})
+    adjust_show_counts(shows, -1)
+    db.session.query(Show).filter(Show.venue_id == venue.id).delete(synchronize_session=False)
     db.session.delete(venue)
     db.session.commit()
+    invalidate_recently_listed()
+    invalidate_detail_pages(venue_ids=[venue.id], artist_ids=artist_ids)
     error_code = 200
-    flash('Venue +', successfully)
+    flash('Venue was successfully deleted!')
   except:
     db.session.rollback()
     error_code = 404
@@ -323,61 +1111,58 @@ def delete_venue(venue_id):
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@views.route('/artists')
 def artists():
   # TODO: replace with real data returned from querying the database
-  artists = Artist.query.all()
+  validators = None if session.get('_flashes') else table_validators(Artist)
+  response = not_modified(validators)
+  if response:
+    return response
+
+  params = facet_params()
+  query = db.session.query(Artist.id, Artist.name, Artist.upcoming_shows_count, Artist.updated_at) \
+    .filter(*facet_filters(Artist, params))
+  page = paginate(query, [Artist.id])
   data = []
 
-  for artist in artists:
+  for artist in page.items:
     data.append({
       "id": artist.id,
-      "name": artist.name
+      "name": artist.name,
+      "num_upcoming_shows": artist.upcoming_shows_count,
+      "updated_at": artist.updated_at
     })
 
-  return render_template('pages/artists.html', artists=data)
+  facets = facet_links(Artist, params)
+  return with_validators(render_template('pages/artists.html', artists=data, page=page, params=params, facets=facets), validators)
 
-@app.route('/artists/search', methods=['POST'])
+@views.route('/artists/search', methods=['POST'])
 def search_artists():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
-  keyWord = request.form.get('search_term', '').lower()
+  keyWord = request.form.get('search_term', '').strip().lower()
   if not keyWord:
     flash('Enter a search keyword')
     return render_template('pages/artists.html')
 
-  response1 = {"count" : 0, "data": []}
-  artists = Artist.query.all()
-  for artist in artists:
-    if keyWord in artist.name.lower():
-      data = {
-        "id": artist.id,
-        "name": artist.name
-      }
-      response1["data"].append(data)
-      response1["count"] +=1
-
-  response2 = {"count" : 0, "data": []}
-  artists = Artist.query.all()
-  for artist in artists:
-    if keyWord in f'{artist.city.lower()}, {artist.state.lower()}':
-      data = {
-        "id": artist.id,
-        "name": artist.name,
-        "state": artist.state,
-        "city": artist.city
-      }
-      response2["data"].append(data)
-      response2["count"] +=1
-
-  return render_template('pages/search_artists.html', results=[response1, response2], search_term=request.form.get('search_term', ''))
-
-@app.route('/artists/<int:artist_id>')
+  return render_template('pages/search_artists.html', results=search_results(Artist, keyWord), search_term=request.form.get('search_term', ''))
+
+@views.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id
 
+  key = 'artist:%d' % artist_id
+  cacheable = not session.get('_flashes')
+  validators = detail_validators(Artist, artist_id) if cacheable else None
+  response = not_modified(validators)
+  if response:
+    return response
+  cached = detail_cache.get(key) if cacheable else None
+  if cached is not None and cached[1] == validators:
+    return with_validators(cached[0], validators)
+
   artist = Artist.query.get(artist_id)
   if not artist:
     flash('Artist does not exist')
@@ -396,57 +1181,41 @@ def show_artist(artist_id):
   if artist.seeking_venue:
     data["seeking_description"] = artist.seeking_description
   data["image_link"] = artist.image_link
-  data["past_shows"] = []
-  data["upcoming_shows"] = []
-  shows = artist.shows
-  prev_shows = []
-  next_shows = []
-  for show in shows:
-    if dateutil.parser.parse(show.start_time) > datetime.now():
-      next_shows.append(show)
-    else:
-      prev_shows.append(show)
-  for show in prev_shows:
-    cur_show = {}
-    venue = Venue.query.get(show.venue_id)
-    cur_show["venue_id"] = venue.id
-    cur_show["venue_name"] = venue.name
-    cur_show["venue_image_link"] = venue.image_link
-    cur_show["start_time"] = show.start_time
-    data["past_shows"].append(cur_show)
-  for show in next_shows:
-    cur_show = {}
-    venue = Venue.query.get(show.venue_id)
-    cur_show["venue_id"] = venue.id
-    cur_show["venue_name"] = venue.name
-    cur_show["venue_image_link"] = venue.image_link
-    cur_show["start_time"] = show.start_time
-    data["upcoming_shows"].append(cur_show)
+  data["past_shows"], data["upcoming_shows"] = detail_shows(Show.artist_id, artist.id, Venue)
   
   data["past_shows_count"] = len(data["past_shows"])
   data["upcoming_shows_count"] = len(data["upcoming_shows"])
 
-  return render_template('pages/show_artist.html', artist=data)
+  html = render_template('pages/show_artist.html', artist=data)
+  if cacheable:
+    detail_cache.set(key, (html, validators), ttl=detail_ttl(data["upcoming_shows"]))
+  return with_validators(html, validators)
+
+@views.route('/artists/<int:artist_id>/calendar.ics')
+def artist_calendar(artist_id):
+  return calendar_feed(Artist, artist_id)
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@views.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
   
   artist = Artist.query.get(artist_id)
   if not artist:
     flash('Artist does not exist')
     return render_template('pages/home.html')
+  from forms import ArtistForm
   form = ArtistForm(obj=artist)
   
   # TODO: populate form with fields from artist with ID <artist_id>
   return render_template('forms/edit_artist.html', form=form, artist=artist)
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@views.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
   # TODO: take values from the form submitted, and update existing
   # artist record with ID <artist_id> using the new attributes
 
+  from forms import ArtistForm
   form = ArtistForm()
   if not form.validate_on_submit():
     flash('One or more form fields are invalid. Please re-fill correctly.')
@@ -467,40 +1236,43 @@ def edit_artist_submission(artist_id):
 
     available_time = request.form.get('available_time').replace(' ', '')
     artist.available_time = ' - '.join(available_time.split('-'))
-    genres = request.form.getlist('genres')
-    artist.genres = []
-    for genre in genres:
-      genre_present = Genre.query.filter_by(name=genre).all()
-      if not genre_present:
-        g = Genre(name=genre)
-        db.session.add(g)
-      else:
-        g = genre_present[0]
-      g.artists.append(artist)
+    artist.available_from, artist.available_until = availability(artist.available_time)
+    artist.updated_at = utcnow()
+    sync_genres(artist_genres, 'artist_id', artist.id, request.form.getlist('genres'))
+    venue_ids = [row.venue_id for row in db.session.query(Show.venue_id).filter(Show.artist_id == artist.id).distinct()]
     db.session.commit()
+    invalidate_recently_listed()
+    invalidate_detail_pages(venue_ids=venue_ids, artist_ids=[artist_id])
     flash('Artist ' + request.form['name'] + ' was successfully updated!')
   except:
     db.session.rollback()
+    clear_genre_registry()
     flash('An error occured ' + request.form['name'] + ' could not be updated!')
   finally:
     db.session.close()
   return redirect(url_for('show_artist', artist_id=artist_id))
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@views.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
   
   venue = Venue.query.get(venue_id)
   if not venue:
     flash('Venue does not exist')
     return render_template('pages/home.html')
+  from forms import VenueForm
   form = VenueForm(obj=venue)
+  # Leave the coordinates blank when they came from the city/state table, so
+  # a new city or state moves the venue.
+  if (venue.latitude, venue.longitude) == geo.locate(venue.city, venue.state):
+    form.latitude.data = form.longitude.data = None
   # TODO: populate form with values from venue with ID <venue_id>
   return render_template('forms/edit_venue.html', form=form, venue=venue)
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@views.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
   # TODO: take values from the form submitted, and update existing
   # venue record with ID <venue_id> using the new attributes
+  from forms import VenueForm
   form = VenueForm()
   if not form.validate_on_submit():
     flash('One or more form fields are invalid. Please re-fill correctly.')
@@ -518,21 +1290,19 @@ def edit_venue_submission(venue_id):
     venue.facebook_link = request.form.get('facebook_link')
     venue.seeking_talent = True if request.form.get('seeking_talent') == 'YES' else False
     venue.seeking_description = request.form.get('seeking_description')
-    genres = request.form.getlist('genres')
-    venue.genres = []
-    for genre in genres:
-      genre_present = Genre.query.filter_by(name=genre).all()
-      if not genre_present:
-        g = Genre(name=genre)
-        db.session.add(g)
-      else:
-        g = genre_present[0]
-      g.venues.append(venue)
+    for column, value in venue_location(venue.city, venue.state, form.latitude.data, form.longitude.data).items():
+      setattr(venue, column, value)
+    venue.updated_at = utcnow()
+    sync_genres(venue_genres, 'venue_id', venue.id, request.form.getlist('genres'))
+    artist_ids = [row.artist_id for row in db.session.query(Show.artist_id).filter(Show.venue_id == venue.id).distinct()]
 
     db.session.commit()
+    invalidate_recently_listed()
+    invalidate_detail_pages(venue_ids=[venue_id], artist_ids=artist_ids)
     flash('Venue ' + request.form['name'] + ' was successfully updated!')
   except:
     db.session.rollback()
+    clear_genre_registry()
     flash('An error occured ' + request.form['name'] + ' could not be updated!')
   finally:
     db.session.close()
@@ -541,16 +1311,18 @@ def edit_venue_submission(venue_id):
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@views.route('/artists/create', methods=['GET'])
 def create_artist_form():
+  from forms import ArtistForm
   form = ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
-@app.route('/artists/create', methods=['POST'])
+@views.route('/artists/create', methods=['POST'])
 def create_artist_submission():
   # called upon submitting the new artist listing form
   # TODO: insert form data as a new Venue record in the db, instead
   # TODO: modify data to be the data object returned from db insertion
+  from forms import ArtistForm
   form = ArtistForm()
   if not form.validate_on_submit():
     flash('One or more form fields are invalid. Please re-fill correctly.')
@@ -568,24 +1340,19 @@ def create_artist_submission():
     seeking_description = request.form.get('seeking_description')
     available_time = request.form.get('available_time').replace(' ', '')
     available_time = ' - '.join(available_time.split('-'))
-    new_artist = Artist(name=name, city=city, state=state, phone=phone, image_link=image_link, website=website, facebook_link=facebook_link, seeking_venue=seeking_venue, seeking_description=seeking_description, available_time=available_time)
-    genres = set(request.form.getlist('genres'))
-    for genre in genres:
-      genre_present = Genre.query.filter_by(name=genre).all()
-      if not genre_present:
-        g = Genre(name=genre)
-        db.session.add(g)
-      else:
-        g = genre_present[0]
-      g.artists.append(new_artist)
-
+    available_from, available_until = availability(available_time)
+    new_artist = Artist(name=name, city=city, state=state, phone=phone, image_link=image_link, website=website, facebook_link=facebook_link, seeking_venue=seeking_venue, seeking_description=seeking_description, available_time=available_time, available_from=available_from, available_until=available_until)
     db.session.add(new_artist)
+    db.session.flush()
+    sync_genres(artist_genres, 'artist_id', new_artist.id, request.form.getlist('genres'), current=set())
     db.session.commit()
+    invalidate_recently_listed()
     # on successful db insert, flash success
     flash('Artist ' + request.form['name'] + ' was successfully listed!')
   # TODO: on unsuccessful db insert, flash an error instead.
   except:
     db.session.rollback()
+    clear_genre_registry()
     flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
   # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
@@ -598,49 +1365,67 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@views.route('/shows')
 def shows():
   # displays list of shows at /shows
   # TODO: replace with real venues data.
   #       num_shows should be aggregated based on number of upcoming shows per venue.
 
-  shows = Show.query.order_by('id').all()
-  data = {"old_shows":[], "upcoming_shows":[]}
-
-  for show in shows:
-    artist = Artist.query.get(show.artist_id)
-    venue = Venue.query.get(show.venue_id)
-    if datetime.now() > dateutil.parser.parse(show.start_time):
-      data["old_shows"].append({
-        "venue_id": show.venue_id,
-        "venue_name": venue.name,
-        "artist_id": show.artist_id,
-        "artist_name": artist.name,
-        "artist_image_link": artist.image_link,
-        "start_time": show.start_time
-      })
-    else:
-      data["upcoming_shows"].append({
-        "venue_id": show.venue_id,
-        "venue_name": venue.name,
-        "artist_id": show.artist_id,
-        "artist_name": artist.name,
-        "artist_image_link": artist.image_link,
-        "start_time": show.start_time
-      })
-
-  return render_template('pages/shows.html', shows=data)
+  params = range_params()
+  try:
+    conditions = show_range()
+  except ValueError as error:
+    flash(str(error))
+    return render_template('pages/shows.html', shows={"old_shows": [], "upcoming_shows": []}, params=params), 400
+
+  validators = None if session.get('_flashes') else shows_validators(conditions)
+  response = not_modified(validators)
+  if response:
+    return response
+
+  # One joined statement per page: only the columns the tiles render, with
+  # the past/upcoming split computed by the database. The timeline is paged
+  # by (start_time, id) and opens at the next upcoming show, or at the start
+  # of the ?from=/?to= range.
+  query = db.session.query(
+    Show.id,
+    Show.venue_id,
+    Venue.name.label('venue_name'),
+    Show.artist_id,
+    Artist.name.label('artist_name'),
+    Artist.image_link.label('artist_image_link'),
+    Show.start_time,
+    is_upcoming().label('upcoming'),
+    Show.updated_at,
+    Venue.updated_at.label('venue_updated_at'),
+    Artist.updated_at.label('artist_updated_at')
+  ).join(Venue, Venue.id == Show.venue_id).join(Artist, Artist.id == Show.artist_id).filter(*conditions)
+  page = paginate(query, [Show.start_time, Show.id], start=None if conditions else is_upcoming())
 
-@app.route('/shows/create', methods=['GET'])
+  data = {"old_shows":[], "upcoming_shows":[]}
+  labels = format_datetimes([row.start_time for row in page.items], 'full')
+  for row, label in zip(page.items, labels):
+    show = row._asdict()
+    show["start_time_label"] = label
+    upcoming = show.pop('upcoming')
+    data["upcoming_shows" if upcoming else "old_shows"].append(show)
+  # Most recent past shows first.
+  data["old_shows"].reverse()
+
+  return with_validators(render_template('pages/shows.html', shows=data, page=page, params=params), validators)
+
+@views.route('/shows/create', methods=['GET'])
 def create_shows():
   # renders form. do not touch.
+  from forms import ShowForm
   form = ShowForm()
   return render_template('forms/new_show.html', form=form)
 
-@app.route('/shows/create', methods=['POST'])
+@views.route('/shows/create', methods=['POST'])
 def create_show_submission():
   # called to create new shows in the db, upon submitting new show listing form
   # TODO: insert form data as a new Show record in the db, instead
+  from forms import DEFAULT_SHOW_MINUTES, ShowForm
   form = ShowForm()
   if not form.validate_on_submit():
     flash('One or more form fields are invalid. Please re-fill correctly.')
@@ -650,41 +1435,45 @@ def create_show_submission():
   try:
     artist_id = request.form.get('artist_id')
     venue_id = request.form.get('venue_id')
-    start_time = request.form.get('start_time')
 
-    artist = Artist.query.get(artist_id)
+    # Row locks on the artist and the venue make concurrent bookings of either
+    # wait for this one, so the conflict check below can't race.
+    artist = Artist.query.with_for_update().get(artist_id)
     if not artist:
       flash('No artist with ID ' + artist_id)
       return render_template('forms/new_show.html', form=form)
 
-    if artist.available_time:
-      period = artist.available_time.split('-')
-      open_time = time.strptime(period[0].strip(' '), '%H:%M')
-      close_time = time.strptime(period[1].strip(' '), '%H:%M')
-
-      hour_min = start_time.split(' ')[1].split(':')[:2]
-      hour_min = ":".join(hour_min)
-      cur_time = time.strptime(hour_min, '%H:%M')
-
-      if open_time < close_time:
-        if not (cur_time >= open_time and cur_time <= close_time):
-          flash(artist.name + ' not available at ' + hour_min + '. Kindly visit their page for available booking periods.')
-          return render_template('forms/new_show.html', form=form)
-      else:
-        if not (cur_time >= open_time or cur_time <= close_time):
-          flash(artist.name + ' not available at ' + hour_min + '. Kindly visit their page for available booking periods.')
-          return render_template('forms/new_show.html', form=form)
+    local_start = form.start_time.data
+    if not is_available(artist.available_from, artist.available_until, local_start.hour * 60 + local_start.minute):
+      flash(artist.name + ' not available at ' + local_start.strftime('%H:%M') + '. Kindly visit their page for available booking periods.')
+      return render_template('forms/new_show.html', form=form)
 
-    venue = Venue.query.get(venue_id)
+    venue = Venue.query.with_for_update().get(venue_id)
     if not venue:
       flash('No venue with ID ' + venue_id)
       return render_template('forms/new_show.html', form=form)
 
-    show = Show(artist_id=artist_id, venue_id=venue_id, start_time=start_time)
+    # The form posts the server's local time; store it as UTC.
+    start_time = local_start.astimezone(timezone.utc)
+    end_time = start_time + timedelta(minutes=form.duration.data or DEFAULT_SHOW_MINUTES)
+    conflict = booking_conflicts(start_time, end_time, [venue.id], [artist.id]).first()
+    if conflict:
+      booked = venue.name if conflict.venue_id == venue.id else artist.name
+      flash(booked + ' already has a show booked at that time.')
+      return render_template('forms/new_show.html', form=form)
+
+    upcoming = start_time >= datetime.now(timezone.utc)
+    show = Show(artist_id=artist.id, venue_id=venue.id, start_time=start_time, end_time=end_time, upcoming=upcoming)
     db.session.add(show)
+    adjust_show_counts([(venue.id, artist.id, upcoming)], 1)
     db.session.commit()
+    invalidate_detail_pages(venue_ids=[venue.id], artist_ids=[artist.id])
     flash('Show was successfully listed!')
   # on successful db insert, flash success
+  except IntegrityError:
+    # Lost a race to another booking; the exclusion constraints caught it.
+    db.session.rollback()
+    flash('The artist or venue already has a show booked at that time.')
   except:
     db.session.rollback()
     flash('An error occurred. Show could not be listed.')
@@ -695,36 +1484,529 @@ def create_show_submission():
     db.session.close()
   return render_template('pages/home.html')
 
-@app.errorhandler(404)
+#  API
+#  ----------------------------------------------------------------
+
+# Read-only JSON under /api/v1. Collections are keyset-paged (?after=,
+# ?limit=) and streamed row by row from a server-side cursor instead of being
+# built as one list; ?fields= selects the columns to fetch and return.
+
+API_FIELDS = {
+  'venues': {
+    'id': Venue.id, 'name': Venue.name, 'city': Venue.city, 'state': Venue.state,
+    'address': Venue.address, 'phone': Venue.phone, 'image_link': Venue.image_link,
+    'facebook_link': Venue.facebook_link, 'website': Venue.website,
+    'seeking_talent': Venue.seeking_talent, 'seeking_description': Venue.seeking_description,
+    'latitude': Venue.latitude, 'longitude': Venue.longitude,
+    'upcoming_shows_count': Venue.upcoming_shows_count, 'past_shows_count': Venue.past_shows_count
+  },
+  'artists': {
+    'id': Artist.id, 'name': Artist.name, 'city': Artist.city, 'state': Artist.state,
+    'phone': Artist.phone, 'image_link': Artist.image_link, 'facebook_link': Artist.facebook_link,
+    'website': Artist.website, 'seeking_venue': Artist.seeking_venue,
+    'seeking_description': Artist.seeking_description, 'available_time': Artist.available_time,
+    'upcoming_shows_count': Artist.upcoming_shows_count, 'past_shows_count': Artist.past_shows_count
+  },
+  'shows': {
+    'id': Show.id, 'start_time': Show.start_time, 'end_time': Show.end_time,
+    'venue_id': Show.venue_id, 'venue_name': Venue.name.label('venue_name'),
+    'venue_image_link': Venue.image_link.label('venue_image_link'),
+    'artist_id': Show.artist_id, 'artist_name': Artist.name.label('artist_name'),
+    'artist_image_link': Artist.image_link.label('artist_image_link')
+  }
+}
+
+# Related data the venue/artist detail endpoints add unless ?fields= leaves it out.
+API_DETAIL_EXTRAS = ('genres', 'past_shows', 'upcoming_shows')
+
+def api_error(message, status):
+  return make_response(jsonify({"error": message}), status)
+
+def api_fields(resource, extras=()):
+  available = list(API_FIELDS[resource]) + list(extras)
+  requested = request.args.get('fields')
+  if not requested:
+    return available
+  names = [name.strip() for name in requested.split(',') if name.strip()]
+  unknown = [name for name in names if name not in available]
+  if unknown or not names:
+    abort(api_error('Unknown field(s): %s' % ', '.join(unknown), 400))
+  return names
+
+def api_value(value):
+  return value.isoformat() if isinstance(value, datetime) else value
+
+def api_query(resource, columns):
+  query = db.session.query(*columns)
+  if resource == 'shows':
+    query = query.select_from(Show).join(Venue, Venue.id == Show.venue_id).join(Artist, Artist.id == Show.artist_id)
+  return query
+
+def api_collection(resource, key_columns):
+  names = api_fields(resource)
+  columns = [API_FIELDS[resource][name] for name in names]
+  columns += [column for column in key_columns if column.key not in names]
+  size = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+  size = max(1, min(size, current_app.config['API_MAX_PAGE_SIZE']))
+
+  query = api_query(resource, columns)
+  cursor = request.args.get('after')
+  if cursor:
+    values = decode_cursor(cursor, key_columns)
+    if values is None:
+      return api_error('Invalid cursor', 400)
+    query = query.filter(keyset_filter(key_columns, values, True))
+  query = query.order_by(*key_columns).limit(size).yield_per(current_app.config['API_STREAM_BATCH'])
+
+  def generate():
+    yield '{"data": ['
+    count, last = 0, None
+    for row in query:
+      yield (', ' if count else '') + json.dumps({name: api_value(getattr(row, name)) for name in names})
+      count, last = count + 1, row
+    next_cursor = encode_cursor([getattr(last, c.key) for c in key_columns]) if count == size else None
+    yield '], "next": %s}' % json.dumps(next_cursor)
+
+  return Response(stream_with_context(generate()), mimetype='application/json')
+
+def api_shows(condition, other):
+  # Past and upcoming shows of one venue/artist, with the other side's name
+  # and image, from a single joined statement.
+  prefix = 'artist' if other is Artist else 'venue'
+  rows = db.session.query(
+    Show.id, Show.start_time, other.id.label('other_id'), other.name.label('other_name'),
+    other.image_link.label('other_image_link'), is_upcoming().label('upcoming')
+  ).join(other, other.id == (Show.artist_id if other is Artist else Show.venue_id)) \
+    .filter(condition).order_by(Show.start_time, Show.id)
+  shows = {"past_shows": [], "upcoming_shows": []}
+  for row in rows:
+    shows["upcoming_shows" if row.upcoming else "past_shows"].append({
+      "id": row.id,
+      "start_time": api_value(row.start_time),
+      prefix + "_id": row.other_id,
+      prefix + "_name": row.other_name,
+      prefix + "_image_link": row.other_image_link
+    })
+  shows["past_shows"].reverse()
+  return shows
+
+def api_detail(resource, model, entity_id, association, key, other):
+  names = api_fields(resource, API_DETAIL_EXTRAS)
+  fields = [name for name in names if name in API_FIELDS[resource]]
+  row = db.session.query(*[API_FIELDS[resource][name] for name in fields] or [model.id]) \
+    .filter(model.id == entity_id).first()
+  if row is None:
+    return api_error('%s %d not found' % (model.__name__, entity_id), 404)
+
+  data = {name: api_value(getattr(row, name)) for name in fields}
+  if 'genres' in names:
+    data["genres"] = [genre.name for genre in db.session.query(Genre.name)
+      .join(association, association.c.genre_id == Genre.id)
+      .filter(association.c[key] == entity_id).order_by(Genre.name)]
+  if 'past_shows' in names or 'upcoming_shows' in names:
+    shows = api_shows(getattr(Show, key) == entity_id, other)
+    for section in ('past_shows', 'upcoming_shows'):
+      if section in names:
+        data[section] = shows[section]
+        data[section + '_count'] = len(shows[section])
+  return jsonify(data)
+
+@views.route('/api/v1/venues')
+def api_venues():
+  return api_collection('venues', [Venue.id])
+
+@views.route('/api/v1/venues/<int:venue_id>')
+def api_venue(venue_id):
+  return api_detail('venues', Venue, venue_id, venue_genres, 'venue_id', Artist)
+
+@views.route('/api/v1/artists')
+def api_artists():
+  return api_collection('artists', [Artist.id])
+
+@views.route('/api/v1/artists/<int:artist_id>')
+def api_artist(artist_id):
+  return api_detail('artists', Artist, artist_id, artist_genres, 'artist_id', Venue)
+
+@views.route('/api/v1/shows')
+def api_show_list():
+  return api_collection('shows', [Show.start_time, Show.id])
+
+@views.route('/api/v1/shows/<int:show_id>')
+def api_show(show_id):
+  names = api_fields('shows')
+  row = api_query('shows', [API_FIELDS['shows'][name] for name in names]).filter(Show.id == show_id).first()
+  if row is None:
+    return api_error('Show %d not found' % show_id, 404)
+  return jsonify({name: api_value(getattr(row, name)) for name in names})
+
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+#----------------------------------------------------------------------------#
+# CLI.
+#----------------------------------------------------------------------------#
+
+# `flask import venues|artists|genres|shows FILE` loads whole catalogs from CSV
+# or JSONL. Every row is checked with the form the matching create route uses;
+# valid rows are written in batches of IMPORT_BATCH_SIZE, one transaction and
+# a handful of statements per batch. Invalid rows are reported and skipped.
+
+import_cli = AppGroup('import', help='Bulk import venues, artists, genres and shows.')
+
+def read_import_rows(path, format=None):
+  # Yields (line number, row). JSONL lines that aren't JSON objects are passed
+  # through as-is and rejected by validation.
+  import csv
+  format = format or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+  with open(path, newline='', encoding='utf-8') as f:
+    if format == 'csv':
+      reader = csv.DictReader(f)
+      for row in reader:
+        yield reader.line_num, {key.strip(): value for key, value in row.items() if key}
+    else:
+      for line, text in enumerate(f, start=1):
+        if not text.strip():
+          continue
+        try:
+          yield line, json.loads(text)
+        except ValueError:
+          yield line, text.rstrip('\r\n')
+
+def import_formdata(row):
+  # Shape a CSV/JSON row like a form post: genres may be a list or a
+  # comma-separated string, booleans become the forms' YES/NO choices.
+  data = MultiDict()
+  for key, value in row.items():
+    if key == 'genres' and isinstance(value, str):
+      value = [name.strip() for name in value.split(',') if name.strip()]
+    if isinstance(value, bool):
+      value = 'YES' if value else 'NO'
+    for item in value if isinstance(value, list) else [value]:
+      if item is not None:
+        data.add(key, str(item))
+  return data
+
+# Columns a row must carry itself, since the form would fill them in with a
+# default meant for the web page (e.g. a show starting "now").
+IMPORT_REQUIRED = {'shows': ('start_time',)}
+
+def validate_import_row(form_class, row, required=()):
+  if not isinstance(row, dict):
+    return None, {'row': ['Not a JSON object']}
+  missing = [field for field in required if not str(row.get(field) or '').strip()]
+  if missing:
+    return None, {field: ['This field is required.'] for field in missing}
+  form = form_class(formdata=import_formdata(row), meta={'csrf': False})
+  if not form.validate():
+    return None, form.errors
+  return form.data, None
+
+def bulk_insert(table, rows):
+  # COPY on Postgres, a single executemany elsewhere.
+  if not rows:
+    return
+  if db.session.get_bind().dialect.name == 'postgresql':
+    import csv
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([[row[column] for column in columns] for row in rows])
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert('COPY %s (%s) FROM STDIN WITH (FORMAT csv)' % (table.name, ', '.join(columns)), buffer)
+  else:
+    db.session.execute(table.insert(), rows)
+
+def insert_listed(model, association, key, columns, batch):
+  # Venues/artists plus their genres. The ids are needed for the association
+  # rows, so these go through INSERT ... RETURNING rather than COPY.
+  table = model.__table__
+  rows = []
+  for line, row, data in batch:
+    values = {column: data[column] or None for column in columns}
+    for flag in ('seeking_talent', 'seeking_venue'):
+      if flag in values:
+        values[flag] = data[flag] == 'YES'
+    if 'available_time' in values:
+      values['available_from'], values['available_until'] = availability(values['available_time'])
+    if 'latitude' in values:
+      values.update(venue_location(values['city'], values['state'], data['latitude'], data['longitude']))
+    rows.append(values)
+  if db.session.get_bind().dialect.name == 'postgresql':
+    # RETURNING from a multi-row INSERT comes back in no guaranteed order, so
+    # the ids are drawn from the sequence first and inserted with their rows.
+    sequence = db.func.pg_get_serial_sequence(str(table.name), 'id')
+    ids = [row[0] for row in db.session.execute(
+      db.select([db.func.nextval(sequence)]).select_from(db.func.generate_series(1, len(rows)))
+    )]
+    for entity_id, values in zip(ids, rows):
+      values['id'] = entity_id
+    db.session.execute(table.insert().values(rows))
+  else:
+    ids = [db.session.execute(table.insert(), values).inserted_primary_key[0] for values in rows]
+  resolve_genre_ids(name for line, row, data in batch for name in data['genres'])
+  bulk_insert(association, [
+    {key: entity_id, "genre_id": genre_registry[name]}
+    for entity_id, (line, row, data) in zip(ids, batch) for name in set(data['genres'])
+  ])
+  return []
+
+def import_venues(batch):
+  columns = ('name', 'city', 'state', 'address', 'phone', 'image_link', 'facebook_link', 'website', 'seeking_talent', 'seeking_description', 'latitude', 'longitude')
+  return insert_listed(Venue, venue_genres, 'venue_id', columns, batch)
+
+def import_artists(batch):
+  columns = ('name', 'city', 'state', 'phone', 'image_link', 'facebook_link', 'website', 'seeking_venue', 'seeking_description', 'available_time')
+  return insert_listed(Artist, artist_genres, 'artist_id', columns, batch)
+
+def import_genres(batch):
+  resolve_genre_ids(data['name'].strip() for line, row, data in batch)
+  return []
+
+def import_shows(batch):
+  from forms import DEFAULT_SHOW_MINUTES
+  # Venues, artists (with their availability) and the bookings already in
+  # the batch's time span are fetched with one query each; rows are then
+  # checked in memory, against those and against each other.
+  rejected, rows, parsed = [], [], []
+  for line, row, data in batch:
+    ids = {}
+    for field in ('venue_id', 'artist_id'):
+      try:
+        ids[field] = int(data[field])
+      except (TypeError, ValueError):
+        pass
+    errors = {field: ['Not a valid id'] for field in ('venue_id', 'artist_id') if field not in ids}
+    if errors:
+      rejected.append((line, row, errors))
+      continue
+    # Like the form route, naive times are the server's local time.
+    local_start = data['start_time']
+    start_time = local_start.astimezone(timezone.utc)
+    end_time = start_time + timedelta(minutes=data['duration'] or DEFAULT_SHOW_MINUTES)
+    parsed.append((line, row, ids['venue_id'], ids['artist_id'], local_start, start_time, end_time))
+  if not parsed:
+    return rejected
+
+  venue_ids = {show[2] for show in parsed}
+  artist_ids = {show[3] for show in parsed}
+  venues = {row.id for row in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))}
+  artists = {row.id: row for row in db.session.query(Artist.id, Artist.available_from, Artist.available_until)
+    .filter(Artist.id.in_(artist_ids))}
+  utc = lambda value: value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+  now = datetime.now(timezone.utc)
+  booked = {}
+  existing = booking_conflicts(min(show[5] for show in parsed), max(show[6] for show in parsed), venue_ids, artist_ids)
+  for show in existing.with_entities(Show.venue_id, Show.artist_id, Show.start_time, Show.end_time):
+    for key in (('venue_id', show.venue_id), ('artist_id', show.artist_id)):
+      booked.setdefault(key, []).append((utc(show.start_time), utc(show.end_time)))
+
+  for line, row, venue_id, artist_id, local_start, start_time, end_time in parsed:
+    errors = {}
+    if venue_id not in venues:
+      errors['venue_id'] = ['No venue with ID %d' % venue_id]
+    artist = artists.get(artist_id)
+    if artist is None:
+      errors['artist_id'] = ['No artist with ID %d' % artist_id]
+    elif not is_available(artist.available_from, artist.available_until, local_start.hour * 60 + local_start.minute):
+      errors['start_time'] = ['Artist not available at ' + local_start.strftime('%H:%M')]
+    keys = (('venue_id', venue_id), ('artist_id', artist_id))
+    for field, key in keys:
+      if any(start < end_time and end > start_time for start, end in booked.get((field, key), ())):
+        errors.setdefault(field, []).append('Already has a show booked at that time')
+    if errors:
+      rejected.append((line, row, errors))
+      continue
+    for key in keys:
+      booked.setdefault(key, []).append((start_time, end_time))
+    rows.append({"artist_id": artist_id, "venue_id": venue_id, "start_time": start_time, "end_time": end_time,
+      "upcoming": start_time >= now})
+  bulk_insert(Show.__table__, rows)
+  adjust_show_counts([(row["venue_id"], row["artist_id"], row["upcoming"]) for row in rows], 1)
+  invalidate_detail_pages({row["venue_id"] for row in rows}, {row["artist_id"] for row in rows})
+  return rejected
+
+def run_import(kind, form_class, write, path, format, batch_size, rejects):
+  counts = {"read": 0, "imported": 0, "rejected": 0}
+
+  def reject(line, row, errors):
+    counts["rejected"] += 1
+    if rejects:
+      rejects.write(json.dumps({"line": line, "errors": errors, "row": row}) + '\n')
+    else:
+      messages = '; '.join('%s: %s' % (field, ' '.join(map(str, message))) for field, message in errors.items())
+      click.echo('line %s rejected: %s' % (line, messages), err=True)
+
+  def flush(batch):
+    try:
+      failed = write(batch)
+      db.session.commit()
+    except Exception as e:
+      db.session.rollback()
+      clear_genre_registry()
+      raise click.ClickException('Batch ending at line %s failed, %d %s committed before it: %s'
+        % (batch[-1][0], counts["imported"], kind, e))
+    for line, row, errors in failed:
+      reject(line, row, errors)
+    counts["imported"] += len(batch) - len(failed)
+    click.echo('%s: %d read, %d imported, %d rejected' % (kind, counts["read"], counts["imported"], counts["rejected"]), err=True)
+
+  batch = []
+  for line, row in read_import_rows(path, format):
+    counts["read"] += 1
+    data, errors = validate_import_row(form_class, row, IMPORT_REQUIRED.get(kind, ()))
+    if errors:
+      reject(line, row, errors)
+      continue
+    batch.append((line, row, data))
+    if len(batch) >= batch_size:
+      flush(batch)
+      batch = []
+  if batch:
+    flush(batch)
+  invalidate_recently_listed()
+  click.echo('Imported %d of %d %s (%d rejected).' % (counts["imported"], counts["read"], kind, counts["rejected"]))
+
+def import_command(kind, form_name, write):
+  @import_cli.command(kind, help='Import %s from a CSV or JSONL file.' % kind)
+  @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+  @click.option('--format', type=click.Choice(['csv', 'jsonl']), help='Defaults to csv for *.csv files, jsonl otherwise.')
+  @click.option('--batch-size', type=click.IntRange(min=1), help='Rows per transaction (default: IMPORT_BATCH_SIZE).')
+  @click.option('--rejects', type=click.File('w'), help='Write rejected rows and their errors to this file as JSONL.')
+  def command(path, format, batch_size, rejects):
+    import forms
+    batch_size = batch_size or current_app.config['IMPORT_BATCH_SIZE']
+    run_import(kind, getattr(forms, form_name), write, path, format, batch_size, rejects)
+  return command
+
+import_command('venues', 'VenueForm', import_venues)
+import_command('artists', 'ArtistForm', import_artists)
+import_command('genres', 'GenreForm', import_genres)
+import_command('shows', 'ShowForm', import_shows)
+
+# `flask shows rollover` moves shows whose start time has passed from their
+# venue's and artist's upcoming counter to the past one; run it from cron
+# every few minutes. `flask shows check` reports counters that disagree with
+# the shows table, and --repair rewrites them.
+
+shows_cli = AppGroup('shows', help='Maintain the venue and artist show counters.')
+
+@shows_cli.command('rollover', help='Move started shows from the upcoming to the past counters.')
+@click.option('--batch-size', type=click.IntRange(min=1), help='Shows per transaction (default: ROLLOVER_BATCH_SIZE).')
+def rollover_shows(batch_size):
+  batch_size = batch_size or current_app.config['ROLLOVER_BATCH_SIZE']
+  moved = 0
+  while True:
+    shows = db.session.query(Show.id, Show.venue_id, Show.artist_id) \
+      .filter(Show.upcoming == True, ~is_upcoming()) \
+      .order_by(Show.start_time).limit(batch_size).with_for_update().all()
+    if not shows:
+      break
+    db.session.query(Show).filter(Show.id.in_([show.id for show in shows])) \
+      .update({Show.upcoming: False}, synchronize_session=False)
+    adjust_show_counts([(show.venue_id, show.artist_id, True) for show in shows], -1)
+    adjust_show_counts([(show.venue_id, show.artist_id, False) for show in shows], 1)
+    db.session.commit()
+    moved += len(shows)
+  click.echo('Moved %d shows to past.' % moved)
+
+@shows_cli.command('check', help='Compare the show counters with the shows table.')
+@click.option('--repair', is_flag=True, help='Rewrite the counters that are off.')
+def check_show_counts(repair):
+  drift = misflagged_shows().count()
+  if drift:
+    click.echo('%d shows that have not started are counted as past' % drift)
+  for model in (Venue, Artist):
+    for entity_id, stored_upcoming, stored_past, upcoming, past in show_count_drift(model):
+      drift += 1
+      click.echo('%s %d: upcoming %d (should be %d), past %d (should be %d)'
+        % (model.__name__, entity_id, stored_upcoming, upcoming, stored_past, past))
+  if drift and repair:
+    repaired = repair_show_counts()
+    db.session.commit()
+    click.echo('Repaired %d counters.' % repaired)
+  elif drift:
+    raise click.ClickException('Counters are off; run with --repair to fix them.')
+  else:
+    click.echo('Show counters are consistent.')
 
 #----------------------------------------------------------------------------#
-# Launch.
+# App factory.
 #----------------------------------------------------------------------------#
 
-# Default port:
-if __name__ == '__main__':
-    app.run()
+# `flask` finds create_app() through FLASK_APP=app.py; gunicorn serves the app
+# built in wsgi.py (see gunicorn.conf.py). `config` is a profile name from
+# config.CONFIGS, a config object, or None for FYYUR_ENV. `flask` passes
+# script_info, and only then is Flask-Migrate (and alembic) loaded.
+
+def create_app(config=None, script_info=None):
+  app = Flask(__name__)
+  app.config.from_object(get_config(config) if config is None or isinstance(config, str) else config)
+  if not app.config.get('SECRET_KEY'):
+    raise RuntimeError('SECRET_KEY is not set. Every worker must sign sessions and CSRF tokens with the same key.')
+
+  db.init_app(app)
+  if script_info is not None:
+    init_migrate(app)
+  init_metrics(app)
+  init_assets(app)
+  init_templating(app, make_cache(app.config))
+  app.extensions['detail_cache'] = make_cache(app.config)
+
+  app.jinja_env.filters['datetime'] = format_datetime
+  app.jinja_env.globals['moment'] = LocalProxy(moment_helper)
+  views.init_app(app)
+  app.register_error_handler(404, not_found_error)
+  app.register_error_handler(500, server_error)
+  app.cli.add_command(import_cli)
+  app.cli.add_command(shows_cli)
+
+  if not app.debug and app.config.get('ERROR_LOG'):
+    init_error_log(app, app.config['ERROR_LOG'])
+  return app
+
+def init_error_log(app, path):
+  # app.logger is the same logger for every app built here, so the file
+  # handler is attached once, not once per create_app() call.
+  path = os.path.abspath(path)
+  if any(getattr(handler, 'baseFilename', None) == path for handler in app.logger.handlers):
+    return
+  file_handler = FileHandler(path)
+  file_handler.setFormatter(
+    Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+  )
+  app.logger.setLevel(logging.INFO)
+  file_handler.setLevel(logging.INFO)
+  app.logger.addHandler(file_handler)
+  app.logger.info('errors')
+
+def init_migrate(app):
+  # For the `flask db` commands and scripts that run migrations.
+  from flask_migrate import Migrate
+  Migrate(app, db)
+
+def moment_helper():
+  # Flask-Moment's `moment` template global, imported the first time a
+  # template uses it (none do yet): flask_moment pulls in setuptools.
+  from flask_moment import _moment
+  return _moment
+
+def dispose_engines(app):
+  # Drop pooled connections inherited from the parent process. Called in each
+  # worker right after fork; the parent must not use them again.
+  with app.app_context():
+    for bind in [None] + list(app.config.get('SQLALCHEMY_BINDS') or ()):
+      db.get_engine(app, bind=bind).dispose()
+
+#----------------------------------------------------------------------------#
+# Launch.
+#----------------------------------------------------------------------------#
 
-# Or specify port manually:
-'''
+# Development server. Production runs several workers under gunicorn:
+#   gunicorn -c gunicorn.conf.py
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
-'''
+    create_app().run(host=os.environ.get('HOST', '127.0.0.1'), port=port)
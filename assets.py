@@ -0,0 +1,248 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import tempfile
+import threading
+
+import click
+from flask import abort, current_app, request, send_file, url_for
+from flask.cli import AppGroup
+from werkzeug.security import safe_join
+
+# Fingerprinted, precompressed static assets.
+#
+# `flask assets build` concatenates and minifies the BUNDLES, copies every
+# file under static/ to static/dist/ with a content hash in its name, and
+# writes .gz (and .br, when the brotli package is installed) next to each
+# compressible file. dist/manifest.json maps the original names to the
+# hashed ones. Templates call asset_url() exactly like url_for(); hashed
+# files are served from /assets with a one-year immutable Cache-Control and
+# the best precompressed variant the client accepts.
+#
+# Builds never remove or rewrite a file in place: every file, and the
+# manifest last, is written to a temporary name and renamed over its target.
+# Workers that build at the same time write the same bytes, and one that
+# reads mid-build sees the old manifest or the new one, never a partial one.
+# Files older builds used stay until `flask assets build --prune`.
+
+BUNDLES = {
+    'css/app.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'js/head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    'js/app.js': [
+        'js/libs/jquery-1.11.1.min.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+        'js/script.js',
+    ],
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.map', '.eot', '.otf', '.ttf', '.txt')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_manifests = {}
+_lock = threading.Lock()
+
+assets_cli = AppGroup('assets', help='Build fingerprinted static assets.')
+
+
+def minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    # Only drops whole-line comments, indentation and blank lines: without a
+    # parser anything more aggressive can change what the code means.
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+def rewrite_css_urls(text, source, target, manifest):
+    # Point url(...) references at the hashed copies, relative to `target`.
+    def replace(match):
+        quote, url = match.group(1), match.group(2)
+        if re.match(r'^([a-z]+:|/|#)', url):
+            return match.group(0)
+        path, suffix = re.match(r'^([^?#]*)(.*)$', url).groups()
+        resolved = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+        if resolved not in manifest:
+            return match.group(0)
+        relative = posixpath.relpath(manifest[resolved], posixpath.dirname(target))
+        return 'url(%s%s%s%s)' % (quote, relative, suffix, quote)
+    return re.sub(r'''url\((['"]?)([^'")]+)\1\)''', replace, text)
+
+
+def fingerprint(name, data):
+    stem, ext = posixpath.splitext(name)
+    return '%s.%s%s' % (stem, hashlib.sha256(data).hexdigest()[:12], ext)
+
+
+def write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def write_variants(path, data):
+    write_atomic(path, data)
+    if not path.endswith(COMPRESSIBLE):
+        return
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        variants.append(('.br', brotli.compress(data)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(data):
+            write_atomic(path + suffix, compressed)
+
+
+def build(static_folder):
+    dist = os.path.join(static_folder, DIST)
+    manifest = {}
+
+    def emit(name, data):
+        manifest[name] = fingerprint(name, data)
+        path = os.path.join(dist, manifest[name])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_variants(path, data)
+
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != dist)
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            with open(path, 'rb') as f:
+                emit(os.path.relpath(path, static_folder).replace(os.sep, '/'), f.read())
+
+    for name, sources in sorted(BUNDLES.items()):
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+                text = f.read()
+            if name.endswith('.css'):
+                parts.append(minify_css(rewrite_css_urls(text, source, name, manifest)))
+            else:
+                parts.append(minify_js(text))
+        emit(name, (('\n' if name.endswith('.css') else ';\n').join(parts) + '\n').encode('utf-8'))
+
+    os.makedirs(dist, exist_ok=True)
+    write_atomic(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def prune_dist(static_folder, manifest):
+    # Remove built files the manifest no longer refers to.
+    dist = os.path.join(static_folder, DIST)
+    keep = {MANIFEST} | {name + suffix for name in manifest.values() for suffix in ('', '.gz', '.br')}
+    removed = 0
+    for root, dirs, files in os.walk(dist):
+        for filename in files:
+            path = os.path.join(root, filename)
+            if filename.startswith('.tmp-'):
+                continue
+            if os.path.relpath(path, dist).replace(os.sep, '/') not in keep:
+                os.unlink(path)
+                removed += 1
+    return removed
+
+
+def is_stale(static_folder):
+    manifest_path = os.path.join(static_folder, DIST, MANIFEST)
+    if not os.path.exists(manifest_path):
+        return True
+    built = os.path.getmtime(manifest_path)
+    dist = os.path.join(static_folder, DIST)
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist]
+        if any(os.path.getmtime(os.path.join(root, filename)) > built for filename in files):
+            return True
+    return False
+
+
+def manifest():
+    # Loaded once per process. With ASSETS_AUTO_BUILD, a missing build is made
+    # on first use, and in debug mode edited sources are rebuilt.
+    app = current_app._get_current_object()
+    static_folder = app.static_folder
+    with _lock:
+        if static_folder in _manifests and not (app.debug and is_stale(static_folder)):
+            return _manifests[static_folder]
+        path = os.path.join(static_folder, DIST, MANIFEST)
+        if app.config['ASSETS_AUTO_BUILD'] and is_stale(static_folder):
+            _manifests[static_folder] = build(static_folder)
+        elif os.path.exists(path):
+            with open(path) as f:
+                _manifests[static_folder] = json.load(f)
+        else:
+            raise RuntimeError('Static assets are not built; run `flask assets build`.')
+        return _manifests[static_folder]
+
+
+def asset_url(endpoint, **values):
+    # url_for() that swaps static files for their fingerprinted copies.
+    filename = values.get('filename')
+    if endpoint == 'static' and filename:
+        hashed = manifest().get(filename)
+        if hashed is not None:
+            return url_for('asset', **dict(values, filename=hashed))
+    return url_for(endpoint, **values)
+
+
+def asset_view(filename):
+    path = safe_join(os.path.join(current_app.static_folder, DIST), filename)
+    if path is None or filename == MANIFEST or not os.path.isfile(path):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    for name, suffix in ENCODINGS:
+        if request.accept_encodings[name] and os.path.isfile(path + suffix):
+            encoding, path = name, path + suffix
+            break
+    response = send_file(path, mimetype=mimetype, conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['ASSETS_MAX_AGE']
+    response.cache_control.immutable = True
+    return response
+
+
+@assets_cli.command('build', help='Bundle, fingerprint and precompress static files.')
+@click.option('--prune', is_flag=True, help='Also delete built files the new build no longer uses.')
+def build_command(prune):
+    built = build(current_app.static_folder)
+    _manifests.pop(current_app.static_folder, None)
+    click.echo('Built %d assets into %s.' % (len(built), os.path.join(current_app.static_folder, DIST)))
+    if prune:
+        click.echo('Pruned %d old files.' % prune_dist(current_app.static_folder, built))
+
+
+def init_assets(app):
+    app.add_url_rule('/assets/<path:filename>', 'asset', asset_view)
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.cli.add_command(assets_cli)
@@ -0,0 +1,404 @@
+"""Route benchmark for Fyyur.
+
+Seeds a synthetic catalog into SQLite (default) or any database URL, drives
+every route in app.py through the Flask test client and prints per-route
+latency percentiles, throughput and SQL statement counts as JSON.
+
+  python bench.py --venues 2000 --artists 2000 --shows 20000 -n 200 -o bench.json
+  python bench.py --database-url postgresql://localhost/fyyur_bench --check
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+warnings.simplefilter('ignore')
+
+# Upper bounds on statements per request for routes whose statement count
+# must not depend on the size of the catalog. --check fails when exceeded.
+STATEMENT_BUDGETS = {
+    ('index', 'GET'): 2,
+    ('venues', 'GET'): 3,
+    ('artists', 'GET'): 3,
+    ('shows', 'GET'): 2,
+    ('show_venue', 'GET'): 4,
+    ('show_artist', 'GET'): 4,
+    ('search_venues', 'POST'): 1,
+    ('venues_near', 'GET'): 1,
+    ('search_artists', 'POST'): 1,
+    ('api_venues', 'GET'): 1,
+    ('api_artists', 'GET'): 1,
+    ('api_show_list', 'GET'): 1,
+    ('api_venue', 'GET'): 3,
+    ('api_artist', 'GET'): 3,
+    ('api_show', 'GET'): 1,
+    ('venue_calendar', 'GET'): 3,
+    ('artist_calendar', 'GET'): 3,
+}
+
+CITIES = [
+    'Aba', 'Abeokuta', 'Abuja', 'Akure', 'Benin City', 'Calabar', 'Enugu',
+    'Ibadan', 'Ikeja', 'Ilorin', 'Jos', 'Kaduna', 'Kano', 'Lagos', 'Lokoja',
+    'Maiduguri', 'Makurdi', 'Onitsha', 'Owerri', 'Port Harcourt', 'Sokoto',
+    'Uyo', 'Warri', 'Yola', 'Zaria',
+]
+WORDS = [
+    'Musical', 'Hop', 'Park', 'Square', 'Live', 'Coffee', 'Dueling', 'Pianos',
+    'Bar', 'Wild', 'Sax', 'Band', 'Guns', 'Petals', 'Blue', 'Note', 'Velvet',
+    'Lounge', 'Echo', 'Hall', 'Groove', 'Garden', 'Arena', 'Studio',
+]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite file')
+    parser.add_argument('--venues', type=int, default=500)
+    parser.add_argument('--artists', type=int, default=500)
+    parser.add_argument('--genres', type=int, default=20)
+    parser.add_argument('--shows', type=int, default=5000)
+    parser.add_argument('-n', '--requests', type=int, default=50, help='measured requests per route')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per route')
+    parser.add_argument('-c', '--concurrency', type=int, default=1)
+    parser.add_argument('--cold', action='store_true', help='clear in-process caches before every request')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--routes', help='comma separated endpoint names to run (default: all)')
+    parser.add_argument('-o', '--output', help='write JSON here instead of stdout')
+    parser.add_argument('--check', action='store_true', help='exit 1 on errors or exceeded statement budgets')
+    return parser.parse_args(argv)
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return None
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def load_app(database_url):
+    # Production profile, so engine and pool options are derived from the
+    # benchmark database exactly as they would be in a deployment.
+    os.environ['FYYUR_ENV'] = 'production'
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    # Production doesn't build assets on demand; the bench has no deploy step.
+    os.environ.setdefault('ASSETS_AUTO_BUILD', '1')
+    # Nor should it append to the checked-in error.log.
+    os.environ.setdefault('ERROR_LOG', '')
+    import app as fyyur
+    app = fyyur.create_app()
+    fyyur.init_migrate(app)
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['TESTING'] = True
+    return fyyur, app
+
+
+def seed(fyyur, args, rng):
+    import flask_migrate
+    import geo
+    from forms import VenueForm
+
+    db = fyyur.db
+    flask_migrate.upgrade(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
+
+    states = [choice[0] for choice in VenueForm.state.kwargs['choices']]
+    genre_names = [choice[0] for choice in VenueForm.genres.kwargs['choices']]
+    genre_names += ['Genre %d' % i for i in range(len(genre_names), args.genres)]
+    genre_names = genre_names[:args.genres]
+
+    def name(i):
+        return '%s %s %d' % (rng.choice(WORDS), rng.choice(WORDS), i)
+
+    def place():
+        return {'city': rng.choice(CITIES), 'state': rng.choice(states)}
+
+    def located(values):
+        # Spread venues up to ~10 km around their city or state centroid.
+        latitude, longitude = geo.locate(values['city'], values['state'])
+        return dict(values, **fyyur.venue_location(
+            values['city'], values['state'], latitude + rng.uniform(-0.09, 0.09), longitude + rng.uniform(-0.09, 0.09)))
+
+    def insert(table, rows, chunk=1000):
+        for i in range(0, len(rows), chunk):
+            db.session.execute(table.insert(), rows[i:i + chunk])
+
+    insert(fyyur.Genre.__table__, [{'id': i + 1, 'name': n} for i, n in enumerate(genre_names)])
+    # Extra venues with no shows are kept for the DELETE scenario.
+    spare = args.requests + args.warmup
+    insert(fyyur.Venue.__table__, [
+        located(dict(place(), id=i, name=name(i), address='%d Main Street' % i, phone='555-0100',
+                     image_link='https://example.com/v%d.jpg' % i, seeking_talent=rng.random() < 0.5))
+        for i in range(1, args.venues + spare + 1)
+    ])
+    insert(fyyur.Artist.__table__, [
+        dict(place(), id=i, name=name(i), phone='555-0199',
+             image_link='https://example.com/a%d.jpg' % i, seeking_venue=rng.random() < 0.5)
+        for i in range(1, args.artists + 1)
+    ])
+    if genre_names:
+        insert(fyyur.venue_genres, [
+            {'venue_id': v, 'genre_id': g}
+            for v in range(1, args.venues + 1)
+            for g in rng.sample(range(1, len(genre_names) + 1), min(2, len(genre_names)))
+        ])
+        insert(fyyur.artist_genres, [
+            {'artist_id': a, 'genre_id': g}
+            for a in range(1, args.artists + 1)
+            for g in rng.sample(range(1, len(genre_names) + 1), min(2, len(genre_names)))
+        ])
+    # One-hour shows on the hour, never two at once for a venue or an artist,
+    # so the seed also satisfies the booking constraints on Postgres.
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    taken, shows = set(), []
+    while len(shows) < args.shows:
+        venue, artist = rng.randint(1, args.venues), rng.randint(1, args.artists)
+        hour = rng.randint(-24 * 365, 24 * 365)
+        if ('venue', venue, hour) in taken or ('artist', artist, hour) in taken:
+            continue
+        taken.update({('venue', venue, hour), ('artist', artist, hour)})
+        start = now + timedelta(hours=hour)
+        shows.append({'id': len(shows) + 1, 'venue_id': venue, 'artist_id': artist,
+                      'start_time': start, 'end_time': start + timedelta(hours=1), 'upcoming': hour >= 0})
+    insert(fyyur.Show.__table__, shows)
+    fyyur.repair_show_counts()
+    db.session.commit()
+    return genre_names
+
+
+def scenarios(args, rng, genre_names):
+    # (endpoint, method) -> callable returning (path, form data or None).
+    from assets import manifest as asset_manifest
+    from forms import VenueForm
+    venue = lambda: rng.randint(1, args.venues)
+    artist = lambda: rng.randint(1, args.artists)
+    show = lambda: rng.randint(1, args.shows)
+    spare_venues = iter(range(args.venues + 1, args.venues + args.requests + args.warmup + 1))
+    genres = lambda: rng.sample(genre_names[:5], min(2, len(genre_names)))
+    term = lambda: rng.choice(WORDS + CITIES).lower()[:rng.randint(2, 6)]
+    states = [choice[0] for choice in VenueForm.state.kwargs['choices']]
+    facets = lambda: rng.choice([
+        '', '?state=%s' % rng.choice(states), '?genre=%s' % rng.choice(genre_names[:5]),
+        '?state=%s&seeking=yes' % rng.choice(states), '?city=%s&genre=%s' % (rng.choice(CITIES), rng.choice(genre_names[:5])),
+    ])
+    def show_range():
+        start = datetime.now() + timedelta(days=rng.randint(-365, 365))
+        return rng.choice(['', '?from=%s' % start.date(), '?from=%s&to=%s' % (start.date(), (start + timedelta(days=30)).date())])
+    near = lambda: '/venues/near?lat=%.4f&lng=%.4f&radius=%d' % (
+        rng.uniform(4.5, 13.5), rng.uniform(3.0, 13.5), rng.choice([10, 25, 100]))
+    # Resolved here, in the app context: requests may run on other threads.
+    stylesheet = '/assets/' + asset_manifest()['css/app.css']
+
+    def venue_form():
+        return {
+            'name': 'Bench Venue %d' % rng.randint(1, 10 ** 9), 'city': rng.choice(CITIES),
+            'state': 'Lagos', 'address': '1 Bench Road', 'genres': genres(),
+            'facebook_link': 'https://facebook.com/bench', 'website': 'https://example.com',
+            'seeking_talent': 'NO',
+        }
+
+    def artist_form():
+        return {
+            'name': 'Bench Artist %d' % rng.randint(1, 10 ** 9), 'city': rng.choice(CITIES),
+            'state': 'Lagos', 'genres': genres(), 'facebook_link': 'https://facebook.com/bench',
+            'website': 'https://example.com', 'seeking_venue': 'NO', 'available_time': '',
+        }
+
+    def show_form():
+        start = datetime.now() + timedelta(days=rng.randint(1, 365), minutes=rng.randint(0, 1440))
+        return {'artist_id': str(artist()), 'venue_id': str(venue()),
+                'start_time': start.strftime('%Y-%m-%d %H:%M:%S')}
+
+    return {
+        ('index', 'GET'): lambda: ('/', None),
+        ('venues', 'GET'): lambda: ('/venues' + facets(), None),
+        ('artists', 'GET'): lambda: ('/artists' + facets(), None),
+        ('shows', 'GET'): lambda: ('/shows' + show_range(), None),
+        ('venues_near', 'GET'): lambda: (near(), None),
+        ('show_venue', 'GET'): lambda: ('/venues/%d' % venue(), None),
+        ('show_artist', 'GET'): lambda: ('/artists/%d' % artist(), None),
+        ('search_venues', 'POST'): lambda: ('/venues/search', {'search_term': term()}),
+        ('search_artists', 'POST'): lambda: ('/artists/search', {'search_term': term()}),
+        ('create_venue_form', 'GET'): lambda: ('/venues/create', None),
+        ('create_artist_form', 'GET'): lambda: ('/artists/create', None),
+        ('create_shows', 'GET'): lambda: ('/shows/create', None),
+        ('edit_venue', 'GET'): lambda: ('/venues/%d/edit' % venue(), None),
+        ('edit_artist', 'GET'): lambda: ('/artists/%d/edit' % artist(), None),
+        ('create_venue_submission', 'POST'): lambda: ('/venues/create', venue_form()),
+        ('create_artist_submission', 'POST'): lambda: ('/artists/create', artist_form()),
+        ('create_show_submission', 'POST'): lambda: ('/shows/create', show_form()),
+        ('edit_venue_submission', 'POST'): lambda: ('/venues/%d/edit' % venue(), venue_form()),
+        ('edit_artist_submission', 'POST'): lambda: ('/artists/%d/edit' % artist(), artist_form()),
+        ('delete_venue', 'DELETE'): lambda: ('/venues/%d' % next(spare_venues), None),
+        ('api_venues', 'GET'): lambda: ('/api/v1/venues', None),
+        ('api_artists', 'GET'): lambda: ('/api/v1/artists', None),
+        ('api_show_list', 'GET'): lambda: ('/api/v1/shows', None),
+        ('api_venue', 'GET'): lambda: ('/api/v1/venues/%d' % venue(), None),
+        ('api_artist', 'GET'): lambda: ('/api/v1/artists/%d' % artist(), None),
+        ('api_show', 'GET'): lambda: ('/api/v1/shows/%d' % show(), None),
+        ('venue_calendar', 'GET'): lambda: ('/venues/%d/calendar.ics' % venue(), None),
+        ('artist_calendar', 'GET'): lambda: ('/artists/%d/calendar.ics' % artist(), None),
+        ('asset', 'GET'): lambda: (stylesheet, None),
+        ('metrics', 'GET'): lambda: ('/metrics', None),
+    }
+
+
+def app_routes(flask_app):
+    routes = set()
+    for rule in flask_app.url_map.iter_rules():
+        if rule.endpoint == 'static':
+            continue
+        for method in rule.methods - {'HEAD', 'OPTIONS'}:
+            routes.add((rule.endpoint, method))
+    return routes
+
+
+def run_route(fyyur, app, make_request, method, count, concurrency, cold, counter):
+    latencies, statuses, statements = [], {}, []
+    lock = threading.Lock()
+
+    def one(_):
+        path, data = make_request()
+        if cold:
+            app.extensions['detail_cache'].clear()
+            fyyur.recently_listed_cache.clear()
+        client = app.test_client()
+        counter.reset()
+        started = time.perf_counter()
+        response = client.open(path, method=method, data=data)
+        response.get_data()  # streamed bodies run their queries while being read
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed * 1000.0)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            statements.append(counter.count)
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, range(count)))
+    else:
+        for i in range(count):
+            one(i)
+    wall = time.perf_counter() - started
+    return latencies, statuses, statements, wall
+
+
+class StatementCounter(object):
+    # Counts statements issued by the current thread.
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+    def __call__(self, *args):
+        self._local.count = self.count + 1
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    rng = random.Random(args.seed)
+
+    tmpdir = None
+    database_url = args.database_url
+    if not database_url:
+        tmpdir = tempfile.mkdtemp(prefix='fyyur-bench-')
+        database_url = 'sqlite:///' + os.path.join(tmpdir, 'bench.db')
+
+    fyyur, app = load_app(database_url)
+    from sqlalchemy import event
+    from sqlalchemy.engine.url import make_url
+
+    report = {
+        'meta': {
+            'database': make_url(database_url).drivername,
+            'dataset': {'venues': args.venues, 'artists': args.artists, 'genres': args.genres, 'shows': args.shows},
+            'requests_per_route': args.requests,
+            'warmup_per_route': args.warmup,
+            'concurrency': args.concurrency,
+            'cold': args.cold,
+            'seed': args.seed,
+            'python': sys.version.split()[0],
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+        },
+        'routes': {},
+    }
+
+    with app.app_context():
+        started = time.perf_counter()
+        genre_names = seed(fyyur, args, rng)
+        report['meta']['seed_seconds'] = round(time.perf_counter() - started, 3)
+
+        counter = StatementCounter()
+        event.listen(fyyur.db.engine, 'before_cursor_execute', counter)
+
+        plan = scenarios(args, rng, genre_names)
+        known = app_routes(app)
+        report['uncovered'] = sorted('%s %s' % route for route in known - set(plan))
+        wanted = set(args.routes.split(',')) if args.routes else None
+
+        failures = []
+        for (endpoint, method), make_request in sorted(plan.items()):
+            if (endpoint, method) not in known or (wanted and endpoint not in wanted):
+                continue
+            run_route(fyyur, app, make_request, method, args.warmup, args.concurrency, args.cold, counter)
+            latencies, statuses, statements, wall = run_route(
+                fyyur, app, make_request, method, args.requests, args.concurrency, args.cold, counter)
+            ordered = sorted(latencies)
+            errors = sum(n for status, n in statuses.items() if status >= 500)
+            result = {
+                'endpoint': endpoint,
+                'method': method,
+                'requests': len(latencies),
+                'errors': errors,
+                'status': {str(k): v for k, v in sorted(statuses.items())},
+                'latency_ms': {
+                    'p50': round(percentile(ordered, 50), 3),
+                    'p95': round(percentile(ordered, 95), 3),
+                    'p99': round(percentile(ordered, 99), 3),
+                    'mean': round(sum(ordered) / len(ordered), 3),
+                    'max': round(ordered[-1], 3),
+                },
+                'throughput_rps': round(len(latencies) / wall, 2) if wall else None,
+                'statements': {
+                    'mean': round(sum(statements) / float(len(statements)), 2),
+                    'max': max(statements),
+                },
+            }
+            budget = STATEMENT_BUDGETS.get((endpoint, method))
+            if budget is not None:
+                result['statements']['budget'] = budget
+                if result['statements']['max'] > budget:
+                    failures.append('%s %s issued %d statements (budget %d)' % (method, endpoint, result['statements']['max'], budget))
+            if errors:
+                failures.append('%s %s returned %d server errors' % (method, endpoint, errors))
+            report['routes']['%s %s' % (method, endpoint)] = result
+        report['failures'] = failures
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.check and failures:
+        for failure in failures:
+            sys.stderr.write(failure + '\n')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Startup benchmark for Fyyur.
+
+Imports app.py and builds the app in fresh interpreters under
+`python -X importtime`, and prints the startup time and the slowest imports
+as JSON. With --check it fails when startup exceeds its budget or when a
+module that should be imported lazily is loaded at startup.
+
+  python bench_startup.py -n 10 -o startup.json
+  python bench_startup.py --check --budget-ms 400
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# What a worker or a `flask` command pays before handling anything, in
+# milliseconds on a warm disk cache. --check fails when the median exceeds it.
+STARTUP_BUDGET_MS = 550
+
+# Only some requests or commands need these; app.py imports them where they
+# are used. --check fails if building the app loads any of them.
+LAZY_MODULES = (
+    'alembic',
+    'babel',
+    'csv',
+    'dateutil',
+    'flask_migrate',
+    'flask_moment',
+    'flask_wtf',
+    'forms',
+    'wtforms',
+)
+
+STARTUP = '''
+import time
+started = time.perf_counter()
+import app
+app.create_app()
+print(time.perf_counter() - started)
+'''
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--runs', type=int, default=5, help='measured interpreter starts')
+    parser.add_argument('--top', type=int, default=15, help='slowest imports to report')
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument('-o', '--output', help='write JSON here instead of stdout')
+    parser.add_argument('--check', action='store_true', help='exit 1 over budget or when a lazy module is imported')
+    return parser.parse_args(argv)
+
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2.0
+
+
+def parse_importtime(text):
+    # {module: (self us, cumulative us)} from -X importtime output.
+    modules = {}
+    for line in text.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(own), int(cumulative))
+    return modules
+
+
+def start_once(root):
+    env = dict(os.environ, FYYUR_ENV='testing', METRICS_ENABLED='1')
+    env.pop('PYTHONPROFILEIMPORTTIME', None)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP],
+        cwd=root, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode:
+        raise RuntimeError('Building the app failed:\n' + result.stderr[-2000:])
+    return float(result.stdout.strip().splitlines()[-1]) * 1000.0, parse_importtime(result.stderr)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    root = os.path.dirname(os.path.abspath(__file__))
+
+    # One unmeasured start writes the bytecode caches.
+    start_once(root)
+    runs = [start_once(root) for _ in range(max(1, args.runs))]
+    startup = [elapsed for elapsed, modules in runs]
+    modules = runs[-1][1]
+
+    slowest = sorted(modules.items(), key=lambda item: -item[1][1])
+    lazy = sorted({name.split('.')[0] for name in modules} & set(LAZY_MODULES))
+    report = {
+        'meta': {'runs': len(runs), 'python': sys.version.split()[0]},
+        'startup_ms': {
+            'median': round(median(startup), 1),
+            'min': round(min(startup), 1),
+            'max': round(max(startup), 1),
+            'budget': args.budget_ms,
+        },
+        'modules_imported': len(modules),
+        'slowest_imports_ms': [
+            {'module': name, 'cumulative': round(cumulative / 1000.0, 2), 'self': round(own / 1000.0, 2)}
+            for name, (own, cumulative) in slowest[:args.top]
+        ],
+        'lazy_modules_imported': lazy,
+    }
+
+    failures = []
+    if report['startup_ms']['median'] > args.budget_ms:
+        failures.append('startup took %.1f ms (budget %.1f ms)' % (report['startup_ms']['median'], args.budget_ms))
+    if lazy:
+        failures.append('modules meant to load lazily were imported at startup: %s' % ', '.join(lazy))
+    report['failures'] = failures
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.check and failures:
+        for failure in failures:
+            sys.stderr.write(failure + '\n')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+# Small pluggable cache used for rendered detail pages.
+#
+# Every backend has the same four methods: get(key) -> value or None,
+# set(key, value, ttl=None), delete(*keys) and clear(). The in-process LRU is
+# the default; the shared backend lets every worker see the same entries and
+# the same invalidations. Anything with that interface (e.g. an LRUCache in
+# tests) can stand in for the shared backend.
+
+
+class NullCache(object):
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+
+class LRUCache(object):
+
+    def __init__(self, max_entries=1024, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache(object):
+    # Shared backend. `client` is anything with redis-py's get/setex/delete
+    # and scan_iter; values are pickled, keys are namespaced by `prefix`.
+
+    def __init__(self, client, default_ttl=300, prefix='fyyur:'):
+        self.client = client
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        self.client.setex(self.prefix + key, max(1, int(ttl)), pickle.dumps(value))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+def make_cache(config):
+    backend = config.get('CACHE_BACKEND', 'lru')
+    ttl = config.get('CACHE_DEFAULT_TTL', 300)
+    if backend == 'lru':
+        return LRUCache(max_entries=config.get('CACHE_MAX_ENTRIES', 1024), default_ttl=ttl)
+    if backend == 'redis':
+        return RedisCache.from_url(config['CACHE_REDIS_URL'], default_ttl=ttl)
+    if backend == 'null':
+        return NullCache()
+    raise ValueError('Unknown CACHE_BACKEND %r' % backend)
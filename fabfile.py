@@ -13,6 +13,18 @@ def test():
         abort("Aborted at user request.")
 
 
+def bench(output='bench_output.json'):
+    # Seeds a synthetic catalog into a temporary SQLite database and fails
+    # if any route errors or exceeds its SQL statement budget.
+    local("python bench.py --check -o {}".format(output))
+
+
+def startup(output='startup_output.json'):
+    # Fails if building the app takes longer than its budget or imports a
+    # module that should load lazily.
+    local("python bench_startup.py --check -o {}".format(output))
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -1,8 +1,24 @@
 import time
 from datetime import datetime
 from flask_wtf import FlaskForm
-from wtforms import BooleanField, StringField, SelectField, SelectMultipleField, DateTimeField, TimeField
-from wtforms.validators import DataRequired, AnyOf, URL, Length, ValidationError
+from wtforms import BooleanField, FloatField, StringField, SelectField, SelectMultipleField, DateTimeField, TimeField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, Length, ValidationError, Optional, NumberRange
+
+# Show length in minutes. The longest allowed show also bounds the booking
+# conflict query in app.py.
+DEFAULT_SHOW_MINUTES = 120
+MAX_SHOW_MINUTES = 12 * 60
+
+def parse_time_range(value):
+    # 'HH:MM - HH:MM' -> (start, end) in minutes after midnight, or None.
+    periods = value.split('-')
+    if len(periods) != 2:
+        return None
+    try:
+        start, end = [time.strptime(period.strip(' '), '%H:%M') for period in periods]
+    except ValueError:
+        return None
+    return start.tm_hour * 60 + start.tm_min, end.tm_hour * 60 + end.tm_min
 
 class ShowForm(FlaskForm):
     artist_id = StringField(
@@ -15,7 +31,12 @@ class ShowForm(FlaskForm):
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired(message='Valid date field required')],
-        default= datetime.today()
+        default=datetime.today
+    )
+    duration = IntegerField(
+        'duration',
+        validators=[Optional(), NumberRange(min=1, max=MAX_SHOW_MINUTES)],
+        default=DEFAULT_SHOW_MINUTES
     )
 
 
@@ -110,6 +131,13 @@ class VenueForm(FlaskForm):
         # TODO implement enum restriction
         'website', validators=[URL()]
     )
+    # Optional; venues without coordinates are placed by city and state.
+    latitude = FloatField(
+        'latitude', validators=[Optional(), NumberRange(min=-90, max=90)]
+    )
+    longitude = FloatField(
+        'longitude', validators=[Optional(), NumberRange(min=-180, max=180)]
+    )
     seeking_talent = SelectField(
         'seeking_talent', validators=[DataRequired()],
         choices=[
@@ -225,20 +253,17 @@ class ArtistForm(FlaskForm):
     )
     def validate_available_time(self, available_time):
         if available_time.data:
-            periods = available_time.data.split('-')
-            if len(periods) < 2 or len(periods) > 2:
-                raise ValidationError("Please enter valid time range separated by '-'")              
-            start = self.toTime(periods[0].strip(" "))
-            end = self.toTime(periods[1].strip(" "))
-            if not start and end:
+            if len(available_time.data.split('-')) != 2:
+                raise ValidationError("Please enter valid time range separated by '-'")
+            period = parse_time_range(available_time.data)
+            if period is None:
                 raise ValidationError('Please enter valid time format')
-            if start == end:
+            if period[0] == period[1]:
                 raise ValidationError('Range cannot start and end at the same time')
-            
-    def toTime(self, input):
-        try:
-            return time.strptime(input, '%H:%M')
-        except ValueError:
-            return False
+
+class GenreForm(FlaskForm):
+    name = StringField(
+        'name', validators=[DataRequired(), Length(max=120)]
+    )
 
 # TODO IMPLEMENT NEW ARTIST FORM AND NEW SHOW FORM
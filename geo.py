@@ -0,0 +1,200 @@
+import math
+
+# Offline venue locations and a geohash grid index.
+#
+# Venues are placed from the tables below: the city, when it is listed for
+# the venue's state, otherwise the state's capital. Coordinates entered on the
+# venue form win over both. No geocoding service is involved.
+#
+# Each located venue also stores the geohash of its position. A geohash names
+# a cell of a fixed grid, and every point in a cell has a hash starting with
+# the cell's, so "venues in this cell" is a range scan on the geohash index.
+# A proximity query covers its bounding box with a few cells, fetches the
+# venues in those ranges that also fall in the box, and only then computes
+# exact great-circle distances.
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Characters stored per venue (~5 m cells) and the most cells a query may
+# cover its box with; fewer, larger cells are used when more would be needed.
+GEOHASH_PRECISION = 9
+MAX_CELLS = 16
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# State capitals, for the states in VenueForm.state.
+STATE_CENTROIDS = {
+    'Abia': (5.5249, 7.4943),
+    'Abuja': (9.0765, 7.3986),
+    'Adamawa': (9.2035, 12.4954),
+    'Akwa Ibom': (5.0377, 7.9128),
+    'Anambra': (6.2104, 7.0741),
+    'Bauchi': (10.3158, 9.8442),
+    'Bayelsa': (4.9267, 6.2676),
+    'Benue': (7.7322, 8.5391),
+    'Borno': (11.8311, 13.1510),
+    'Cross River': (4.9757, 8.3417),
+    'Delta': (6.1980, 6.7319),
+    'Ebonyi': (6.3249, 8.1137),
+    'Edo': (6.3350, 5.6037),
+    'Ekiti': (7.6211, 5.2214),
+    'Enugu': (6.4584, 7.5464),
+    'Gombe': (10.2897, 11.1673),
+    'Imo': (5.4840, 7.0351),
+    'Jigawa': (11.7562, 9.3389),
+    'Kaduna': (10.5105, 7.4165),
+    'Kano': (12.0022, 8.5920),
+    'Katsina': (12.9908, 7.6018),
+    'Kebbi': (12.4539, 4.1975),
+    'Kogi': (7.8023, 6.7333),
+    'Kwara': (8.4966, 4.5421),
+    'Lagos': (6.6018, 3.3515),
+    'Nasarawa': (8.4939, 8.5153),
+    'Niger': (9.6139, 6.5569),
+    'Ogun': (7.1475, 3.3619),
+    'Ondo': (7.2571, 5.2058),
+    'Osun': (7.7827, 4.5418),
+    'Oyo': (7.3775, 3.9470),
+    'Plateau': (9.8965, 8.8583),
+    'Rivers': (4.8156, 7.0498),
+    'Sokoto': (13.0059, 5.2476),
+    'Taraba': (8.8937, 11.3596),
+    'Yobe': (11.7470, 11.9608),
+    'Zamfara': (12.1628, 6.6614),
+}
+
+# Larger cities, keyed by (lower-case city, state).
+CITY_CENTROIDS = {
+    ('aba', 'Abia'): (5.1066, 7.3667),
+    ('abakaliki', 'Ebonyi'): (6.3249, 8.1137),
+    ('abeokuta', 'Ogun'): (7.1475, 3.3619),
+    ('abuja', 'Abuja'): (9.0765, 7.3986),
+    ('ado-ekiti', 'Ekiti'): (7.6211, 5.2214),
+    ('akure', 'Ondo'): (7.2571, 5.2058),
+    ('asaba', 'Delta'): (6.1980, 6.7319),
+    ('awka', 'Anambra'): (6.2104, 7.0741),
+    ('bauchi', 'Bauchi'): (10.3158, 9.8442),
+    ('benin city', 'Edo'): (6.3350, 5.6037),
+    ('birnin kebbi', 'Kebbi'): (12.4539, 4.1975),
+    ('calabar', 'Cross River'): (4.9757, 8.3417),
+    ('damaturu', 'Yobe'): (11.7470, 11.9608),
+    ('dutse', 'Jigawa'): (11.7562, 9.3389),
+    ('enugu', 'Enugu'): (6.4584, 7.5464),
+    ('gombe', 'Gombe'): (10.2897, 11.1673),
+    ('gusau', 'Zamfara'): (12.1628, 6.6614),
+    ('ibadan', 'Oyo'): (7.3775, 3.9470),
+    ('ikeja', 'Lagos'): (6.6018, 3.3515),
+    ('ile-ife', 'Osun'): (7.4905, 4.5521),
+    ('ilorin', 'Kwara'): (8.4966, 4.5421),
+    ('jalingo', 'Taraba'): (8.8937, 11.3596),
+    ('jos', 'Plateau'): (9.8965, 8.8583),
+    ('kaduna', 'Kaduna'): (10.5105, 7.4165),
+    ('kano', 'Kano'): (12.0022, 8.5920),
+    ('katsina', 'Katsina'): (12.9908, 7.6018),
+    ('lafia', 'Nasarawa'): (8.4939, 8.5153),
+    ('lagos', 'Lagos'): (6.5244, 3.3792),
+    ('lekki', 'Lagos'): (6.4698, 3.5852),
+    ('lokoja', 'Kogi'): (7.8023, 6.7333),
+    ('maiduguri', 'Borno'): (11.8311, 13.1510),
+    ('makurdi', 'Benue'): (7.7322, 8.5391),
+    ('minna', 'Niger'): (9.6139, 6.5569),
+    ('nsukka', 'Enugu'): (6.8567, 7.3958),
+    ('ogbomosho', 'Oyo'): (8.1335, 4.2407),
+    ('onitsha', 'Anambra'): (6.1413, 6.8029),
+    ('osogbo', 'Osun'): (7.7827, 4.5418),
+    ('owerri', 'Imo'): (5.4840, 7.0351),
+    ('port harcourt', 'Rivers'): (4.8156, 7.0498),
+    ('sokoto', 'Sokoto'): (13.0059, 5.2476),
+    ('umuahia', 'Abia'): (5.5249, 7.4943),
+    ('uyo', 'Akwa Ibom'): (5.0377, 7.9128),
+    ('warri', 'Delta'): (5.5167, 5.7500),
+    ('yenagoa', 'Bayelsa'): (4.9267, 6.2676),
+    ('yola', 'Adamawa'): (9.2035, 12.4954),
+    ('zaria', 'Kaduna'): (11.0855, 7.7199),
+}
+
+
+def locate(city, state):
+    # (latitude, longitude) for a city in a state, or None if neither is known.
+    found = CITY_CENTROIDS.get(((city or '').strip().lower(), state))
+    return found or STATE_CENTROIDS.get(state)
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        span, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (span[0] + span[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            span[0] = middle
+        else:
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    # (height, width) in degrees of a geohash cell; longitude gets the odd bit.
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** (5 * precision - lat_bits)
+
+
+def prefix_end(prefix):
+    # Smallest string above every hash starting with prefix, or None.
+    while prefix and prefix[-1] == BASE32[-1]:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + BASE32[BASE32.index(prefix[-1]) + 1]
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    # Great-circle distance in kilometres.
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + \
+        math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    # Box holding every point within radius_km, clamped at the poles and at
+    # the antimeridian (nothing here is near either).
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = max(-90.0, latitude - dlat), min(90.0, latitude + dlat)
+    widest = max(abs(south), abs(north))
+    if widest >= 90.0:
+        return south, -180.0, north, 180.0
+    dlng = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(widest))))
+    return south, max(-180.0, longitude - dlng), north, min(180.0, longitude + dlng)
+
+
+def covering_ranges(box, max_cells=MAX_CELLS):
+    # [(start, end)] geohash ranges whose cells cover the box, at the finest
+    # precision that needs at most max_cells cells; adjacent ranges merged.
+    south, west, north, east = box
+    cells = ['']
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        height, width = cell_size(precision)
+        rows = range(int((south + 90.0) // height), min(int((north + 90.0) // height), int(180.0 / height) - 1) + 1)
+        columns = range(int((west + 180.0) // width), min(int((east + 180.0) // width), int(360.0 / width) - 1) + 1)
+        if len(rows) * len(columns) > max_cells:
+            break
+        cells = sorted(
+            encode(-90.0 + (row + 0.5) * height, -180.0 + (column + 0.5) * width, precision)
+            for row in rows for column in columns
+        )
+    ranges = []
+    for prefix in cells:
+        start, end = prefix, prefix_end(prefix) if prefix else None
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
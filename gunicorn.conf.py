@@ -0,0 +1,53 @@
+import multiprocessing
+import os
+import sys
+
+from config import env_bool, env_int
+
+# gunicorn settings: `gunicorn -c gunicorn.conf.py`. Every value can be
+# overridden from the environment.
+#
+# One worker per core by default (twice that plus one for the sync workers,
+# which block on the database). GUNICORN_WORKER_CLASS=gevent switches to
+# cooperative workers that each serve GUNICORN_WORKER_CONNECTIONS requests at
+# once; psycopg2 then needs psycogreen to yield while it waits on Postgres.
+#
+# With preload_app the app is built once in the master and shared with the
+# workers copy-on-write. Any pooled connection the master opened would then
+# be shared too, so post_fork() gives every worker fresh engine pools.
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:%s' % os.environ.get('PORT', '8000'))
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+workers = env_int('GUNICORN_WORKERS', multiprocessing.cpu_count() * (2 if worker_class == 'sync' else 1) + 1)
+worker_connections = env_int('GUNICORN_WORKER_CONNECTIONS', 100)
+threads = env_int('GUNICORN_THREADS', 1)
+preload_app = env_bool('GUNICORN_PRELOAD', True)
+
+timeout = env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = env_int('GUNICORN_KEEPALIVE', 5)
+
+# Recycle workers now and then so slow leaks can't grow without bound; the
+# jitter keeps them from all restarting at once.
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 10000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', 1000)
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.environ.get('GUNICORN_ERROR_LOG', '-')
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            server.log.warning('psycogreen is not installed; database calls will block the gevent worker')
+        else:
+            patch_psycopg()
+    # Only a preloaded app exists in the master; otherwise the worker builds
+    # its own after this hook and has nothing to dispose.
+    if 'wsgi' in sys.modules:
+        from app import dispose_engines
+        dispose_engines(sys.modules['wsgi'].app)
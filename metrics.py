@@ -0,0 +1,198 @@
+import threading
+import time
+
+from flask import Response, g, has_app_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+# Request instrumentation exported in the Prometheus text format.
+#
+# init_metrics() wires everything up only when METRICS_ENABLED is set; when it
+# is off no listener, hook or route is registered, so there is no overhead.
+# Values are per process: with several workers, scrape each one.
+#
+# A request's sample is recorded when its response is closed, not in
+# after_request: streamed responses (the API, calendar feeds) run most of
+# their SQL while the body is being sent, and that belongs to the request.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+class Histogram(object):
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s histogram' % self.name]
+        with self._lock:
+            items = sorted(self._series.items())
+        for label_values, (counts, total, count) in items:
+            labels = ['%s="%s"' % (k, escape(v)) for k, v in zip(self.labels, label_values)]
+            for bound, n in zip(self.buckets, counts):
+                lines.append('%s_bucket{%s} %d' % (self.name, ','.join(labels + ['le="%s"' % format_bound(bound)]), n))
+            lines.append('%s_bucket{%s} %d' % (self.name, ','.join(labels + ['le="+Inf"']), count))
+            suffix = '{%s}' % ','.join(labels) if labels else ''
+            lines.append('%s_sum%s %r' % (self.name, suffix, total))
+            lines.append('%s_count%s %d' % (self.name, suffix, count))
+        return '\n'.join(lines)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_bound(bound):
+    return repr(float(bound))
+
+
+REQUEST_SECONDS = Histogram(
+    'fyyur_request_duration_seconds', 'Total time spent handling a request.',
+    labels=('endpoint', 'method'))
+DB_SECONDS = Histogram(
+    'fyyur_request_db_seconds', 'Time spent executing SQL statements per request.',
+    labels=('endpoint', 'method'))
+DB_STATEMENTS = Histogram(
+    'fyyur_request_db_statements', 'SQL statements executed per request.',
+    labels=('endpoint', 'method'), buckets=STATEMENT_BUCKETS)
+TEMPLATE_SECONDS = Histogram(
+    'fyyur_request_template_seconds', 'Time spent rendering templates per request.',
+    labels=('endpoint', 'method'))
+
+POOL_WAIT_SECONDS = Histogram(
+    'fyyur_db_pool_checkout_wait_seconds', 'Time spent waiting to check a connection out of the pool.',
+    buckets=POOL_WAIT_BUCKETS)
+
+REGISTRY = [REQUEST_SECONDS, DB_SECONDS, DB_STATEMENTS, TEMPLATE_SECONDS, POOL_WAIT_SECONDS]
+
+
+def current():
+    # The per-request accumulator, or None outside an instrumented request.
+    return g.get('_metrics') if has_app_context() else None
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_metrics_started', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    count_statement(conn.info['_metrics_started'].pop())
+
+
+def handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start
+    # time here so the connection's stack doesn't grow.
+    started = context.connection.info.get('_metrics_started') if context.connection is not None else None
+    if started:
+        count_statement(started.pop())
+
+
+def count_statement(started):
+    sample = current()
+    if sample is not None:
+        sample['statements'] += 1
+        sample['db'] += time.perf_counter() - started
+
+
+class TimedTemplate(Template):
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return Template.render(self, *args, **kwargs)
+        finally:
+            sample = current()
+            if sample is not None:
+                sample['template'] += time.perf_counter() - started
+
+
+class TimedQueuePool(QueuePool):
+    # QueuePool._do_get() is where a checkout blocks when the pool is
+    # exhausted, so its duration is the wait to size the pool against.
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return QueuePool._do_get(self)
+        finally:
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+
+def start_request():
+    g._metrics = {'started': time.perf_counter(), 'statements': 0, 'db': 0.0, 'template': 0.0}
+
+
+def finish_request(response):
+    # The sample stays in g, so statements run while a streamed body is
+    # generated still count; it is recorded once the response is closed.
+    sample = g.get('_metrics')
+    if sample is not None:
+        sample['labels'] = (request.endpoint or 'none', request.method)
+        response.call_on_close(lambda: record(sample))
+    return response
+
+
+def teardown_request(exc):
+    # A request that failed before after_request ran has no response to
+    # close; record it here.
+    sample = g.pop('_metrics', None)
+    if sample is not None and 'labels' not in sample:
+        sample['labels'] = (request.endpoint or 'none', request.method)
+        record(sample)
+
+
+def record(sample):
+    # A response may be closed more than once; record the request once.
+    if sample.get('recorded') or sample['labels'][0] == 'metrics':
+        return
+    sample['recorded'] = True
+    labels = sample['labels']
+    REQUEST_SECONDS.observe(time.perf_counter() - sample['started'], *labels)
+    DB_SECONDS.observe(sample['db'], *labels)
+    DB_STATEMENTS.observe(sample['statements'], *labels)
+    TEMPLATE_SECONDS.observe(sample['template'], *labels)
+
+
+def metrics_view():
+    body = '\n'.join(metric.expose() for metric in REGISTRY) + '\n'
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+def init_metrics(app):
+    if not app.config.get('METRICS_ENABLED'):
+        return
+    # Listen on the Engine class: the app's engine is created lazily, on
+    # first use, from whatever database URL is configured by then.
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(Engine, 'handle_error', handle_error)
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        options.setdefault('poolclass', TimedQueuePool)
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    app.jinja_env.template_class = TimedTemplate
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.teardown_request(teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,164 @@
+"""venue coordinates and geohash index
+
+Revision ID: 5d8c3e1b9f64
+Revises: 9b2e4f71c0d8
+Create Date: 2026-10-18 18:27:52.640318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8c3e1b9f64'
+down_revision = '9b2e4f71c0d8'
+branch_labels = None
+depends_on = None
+
+
+# Copies of the venue tables and geohash encoder from geo.py as they were
+# when this revision was written, so the migration doesn't change with it.
+GEOHASH_PRECISION = 9
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+STATE_CENTROIDS = {
+    'Abia': (5.5249, 7.4943),
+    'Abuja': (9.0765, 7.3986),
+    'Adamawa': (9.2035, 12.4954),
+    'Akwa Ibom': (5.0377, 7.9128),
+    'Anambra': (6.2104, 7.0741),
+    'Bauchi': (10.3158, 9.8442),
+    'Bayelsa': (4.9267, 6.2676),
+    'Benue': (7.7322, 8.5391),
+    'Borno': (11.8311, 13.1510),
+    'Cross River': (4.9757, 8.3417),
+    'Delta': (6.1980, 6.7319),
+    'Ebonyi': (6.3249, 8.1137),
+    'Edo': (6.3350, 5.6037),
+    'Ekiti': (7.6211, 5.2214),
+    'Enugu': (6.4584, 7.5464),
+    'Gombe': (10.2897, 11.1673),
+    'Imo': (5.4840, 7.0351),
+    'Jigawa': (11.7562, 9.3389),
+    'Kaduna': (10.5105, 7.4165),
+    'Kano': (12.0022, 8.5920),
+    'Katsina': (12.9908, 7.6018),
+    'Kebbi': (12.4539, 4.1975),
+    'Kogi': (7.8023, 6.7333),
+    'Kwara': (8.4966, 4.5421),
+    'Lagos': (6.6018, 3.3515),
+    'Nasarawa': (8.4939, 8.5153),
+    'Niger': (9.6139, 6.5569),
+    'Ogun': (7.1475, 3.3619),
+    'Ondo': (7.2571, 5.2058),
+    'Osun': (7.7827, 4.5418),
+    'Oyo': (7.3775, 3.9470),
+    'Plateau': (9.8965, 8.8583),
+    'Rivers': (4.8156, 7.0498),
+    'Sokoto': (13.0059, 5.2476),
+    'Taraba': (8.8937, 11.3596),
+    'Yobe': (11.7470, 11.9608),
+    'Zamfara': (12.1628, 6.6614),
+}
+
+CITY_CENTROIDS = {
+    ('aba', 'Abia'): (5.1066, 7.3667),
+    ('abakaliki', 'Ebonyi'): (6.3249, 8.1137),
+    ('abeokuta', 'Ogun'): (7.1475, 3.3619),
+    ('abuja', 'Abuja'): (9.0765, 7.3986),
+    ('ado-ekiti', 'Ekiti'): (7.6211, 5.2214),
+    ('akure', 'Ondo'): (7.2571, 5.2058),
+    ('asaba', 'Delta'): (6.1980, 6.7319),
+    ('awka', 'Anambra'): (6.2104, 7.0741),
+    ('bauchi', 'Bauchi'): (10.3158, 9.8442),
+    ('benin city', 'Edo'): (6.3350, 5.6037),
+    ('birnin kebbi', 'Kebbi'): (12.4539, 4.1975),
+    ('calabar', 'Cross River'): (4.9757, 8.3417),
+    ('damaturu', 'Yobe'): (11.7470, 11.9608),
+    ('dutse', 'Jigawa'): (11.7562, 9.3389),
+    ('enugu', 'Enugu'): (6.4584, 7.5464),
+    ('gombe', 'Gombe'): (10.2897, 11.1673),
+    ('gusau', 'Zamfara'): (12.1628, 6.6614),
+    ('ibadan', 'Oyo'): (7.3775, 3.9470),
+    ('ikeja', 'Lagos'): (6.6018, 3.3515),
+    ('ile-ife', 'Osun'): (7.4905, 4.5521),
+    ('ilorin', 'Kwara'): (8.4966, 4.5421),
+    ('jalingo', 'Taraba'): (8.8937, 11.3596),
+    ('jos', 'Plateau'): (9.8965, 8.8583),
+    ('kaduna', 'Kaduna'): (10.5105, 7.4165),
+    ('kano', 'Kano'): (12.0022, 8.5920),
+    ('katsina', 'Katsina'): (12.9908, 7.6018),
+    ('lafia', 'Nasarawa'): (8.4939, 8.5153),
+    ('lagos', 'Lagos'): (6.5244, 3.3792),
+    ('lekki', 'Lagos'): (6.4698, 3.5852),
+    ('lokoja', 'Kogi'): (7.8023, 6.7333),
+    ('maiduguri', 'Borno'): (11.8311, 13.1510),
+    ('makurdi', 'Benue'): (7.7322, 8.5391),
+    ('minna', 'Niger'): (9.6139, 6.5569),
+    ('nsukka', 'Enugu'): (6.8567, 7.3958),
+    ('ogbomosho', 'Oyo'): (8.1335, 4.2407),
+    ('onitsha', 'Anambra'): (6.1413, 6.8029),
+    ('osogbo', 'Osun'): (7.7827, 4.5418),
+    ('owerri', 'Imo'): (5.4840, 7.0351),
+    ('port harcourt', 'Rivers'): (4.8156, 7.0498),
+    ('sokoto', 'Sokoto'): (13.0059, 5.2476),
+    ('umuahia', 'Abia'): (5.5249, 7.4943),
+    ('uyo', 'Akwa Ibom'): (5.0377, 7.9128),
+    ('warri', 'Delta'): (5.5167, 5.7500),
+    ('yenagoa', 'Bayelsa'): (4.9267, 6.2676),
+    ('yola', 'Adamawa'): (9.2035, 12.4954),
+    ('zaria', 'Kaduna'): (11.0855, 7.7199),
+}
+
+
+def locate(city, state):
+    found = CITY_CENTROIDS.get(((city or '').strip().lower(), state))
+    return found or STATE_CENTROIDS.get(state)
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        span, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (span[0] + span[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            span[0] = middle
+        else:
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def upgrade():
+    op.add_column('venues', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('venues', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('venues', sa.Column('geohash', sa.String(length=12), nullable=True))
+    op.create_index(op.f('ix_venues_geohash'), 'venues', ['geohash'], unique=False)
+
+    # Place existing venues from the bundled city/state table.
+    bind = op.get_bind()
+    places = bind.execute(sa.text('SELECT DISTINCT city, state FROM venues')).fetchall()
+    for city, state in places:
+        location = locate(city, state)
+        if location is None:
+            continue
+        bind.execute(
+            sa.text('UPDATE venues SET latitude = :latitude, longitude = :longitude, geohash = :geohash '
+                    'WHERE city = :city AND state = :state'),
+            latitude=location[0], longitude=location[1], geohash=encode(*location), city=city, state=state)
+
+
+def downgrade():
+    # Plain DROP COLUMN (SQLite 3.35+): rebuilding the table in a batch would
+    # lose the full-text search triggers on venues.
+    op.drop_index(op.f('ix_venues_geohash'), table_name='venues')
+    op.drop_column('venues', 'geohash')
+    op.drop_column('venues', 'longitude')
+    op.drop_column('venues', 'latitude')
@@ -0,0 +1,70 @@
+"""store show start_time as an indexed timestamp
+
+Revision ID: 7c4e2b8a51d3
+Revises: 3a1f0c2d9b10
+Create Date: 2026-10-18 10:02:11.408127
+
+"""
+from datetime import timezone
+
+from alembic import op
+import sqlalchemy as sa
+import dateutil.parser
+
+
+# revision identifiers, used by Alembic.
+revision = '7c4e2b8a51d3'
+down_revision = '3a1f0c2d9b10'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+shows = sa.table('shows',
+    sa.column('id', sa.Integer),
+    sa.column('start_time', sa.String),
+    sa.column('start_at', sa.DateTime(timezone=True))
+)
+
+
+def upgrade():
+    op.add_column('shows', sa.Column('start_at', sa.DateTime(timezone=True), nullable=True))
+
+    # Backfill: the old column held whatever the form posted, in the server's
+    # local time. Parse it once here and store it as UTC.
+    conn = op.get_bind()
+    rows = conn.execute(sa.select([shows.c.id, shows.c.start_time])).fetchall()
+    for i in range(0, len(rows), BATCH_SIZE):
+        params = []
+        for show_id, start_time in rows[i:i + BATCH_SIZE]:
+            parsed = dateutil.parser.parse(start_time)
+            params.append({'show_id': show_id, 'start_at': parsed.astimezone(timezone.utc)})
+        conn.execute(
+            shows.update().where(shows.c.id == sa.bindparam('show_id')).values(start_at=sa.bindparam('start_at')),
+            params
+        )
+
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.drop_column('start_time')
+        batch_op.alter_column('start_at', new_column_name='start_time', nullable=False,
+            existing_type=sa.DateTime(timezone=True))
+    op.create_index(op.f('ix_shows_start_time'), 'shows', ['start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_shows_start_time'), table_name='shows')
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.alter_column('start_time', new_column_name='start_at', nullable=True,
+            existing_type=sa.DateTime(timezone=True))
+    op.add_column('shows', sa.Column('start_time', sa.String(length=50), nullable=True))
+
+    conn = op.get_bind()
+    rows = conn.execute(sa.select([shows.c.id, shows.c.start_at])).fetchall()
+    for show_id, start_at in rows:
+        conn.execute(
+            shows.update().where(shows.c.id == show_id).values(start_time=start_at.strftime('%Y-%m-%d %H:%M:%S'))
+        )
+
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.drop_column('start_at')
+        batch_op.alter_column('start_time', nullable=False, existing_type=sa.String(length=50))
@@ -0,0 +1,30 @@
+"""indexes for the state, city and genre facets
+
+Revision ID: 9b2e4f71c0d8
+Revises: c5d82f1e7a39
+Create Date: 2026-10-18 17:41:36.207514
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b2e4f71c0d8'
+down_revision = 'c5d82f1e7a39'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_venues_state_city_id', 'venues', ['state', 'city', 'id'], unique=False)
+    op.create_index('ix_artists_state_city', 'artists', ['state', 'city'], unique=False)
+    op.create_index('ix_venue_genres_genre_id_venue_id', 'venue_genres', ['genre_id', 'venue_id'], unique=False)
+    op.create_index('ix_artist_genres_genre_id_artist_id', 'artist_genres', ['genre_id', 'artist_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_artist_genres_genre_id_artist_id', table_name='artist_genres')
+    op.drop_index('ix_venue_genres_genre_id_venue_id', table_name='venue_genres')
+    op.drop_index('ix_artists_state_city', table_name='artists')
+    op.drop_index('ix_venues_state_city_id', table_name='venues')
@@ -0,0 +1,44 @@
+"""denormalized upcoming/past show counters on venues and artists
+
+Revision ID: a47e2d90c1f6
+Revises: f3a9c1d7b254
+Create Date: 2026-10-18 15:08:33.612950
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a47e2d90c1f6'
+down_revision = 'f3a9c1d7b254'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('shows', sa.Column('upcoming', sa.Boolean(), server_default=sa.false(), nullable=False))
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute('UPDATE shows SET upcoming = (start_time >= CURRENT_TIMESTAMP)')
+    op.create_index('ix_shows_upcoming_start_time', 'shows', ['upcoming', 'start_time'], unique=False)
+    for table, key in (('venues', 'venue_id'), ('artists', 'artist_id')):
+        op.execute(
+            'UPDATE {table} SET '
+            'upcoming_shows_count = (SELECT count(*) FROM shows WHERE shows.{key} = {table}.id AND shows.upcoming), '
+            'past_shows_count = (SELECT count(*) FROM shows WHERE shows.{key} = {table}.id AND NOT shows.upcoming)'
+            .format(table=table, key=key)
+        )
+
+
+def downgrade():
+    op.drop_index('ix_shows_upcoming_start_time', table_name='shows')
+    # Plain DROP COLUMN (SQLite 3.35+): rebuilding the tables in a batch would
+    # lose their full-text search triggers.
+    for table in ('artists', 'venues'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.drop_column('upcoming')
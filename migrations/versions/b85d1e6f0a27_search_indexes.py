@@ -0,0 +1,68 @@
+"""trigram / full-text search indexes for venues and artists
+
+Revision ID: b85d1e6f0a27
+Revises: 7c4e2b8a51d3
+Create Date: 2026-10-18 11:14:52.093361
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b85d1e6f0a27'
+down_revision = '7c4e2b8a51d3'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venues', 'artists')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table in TABLES:
+            op.execute(
+                "CREATE INDEX ix_{0}_name_trgm ON {0} USING gin (lower(name) gin_trgm_ops)".format(table)
+            )
+            op.execute(
+                "CREATE INDEX ix_{0}_area_trgm ON {0} USING gin (lower(city || ', ' || state) gin_trgm_ops)".format(table)
+            )
+    elif dialect == 'sqlite':
+        for table in TABLES:
+            op.execute(
+                "CREATE VIRTUAL TABLE {0}_search USING fts5(name, area, tokenize='trigram')".format(table)
+            )
+            op.execute(
+                "INSERT INTO {0}_search (rowid, name, area) "
+                "SELECT id, name, city || ', ' || state FROM {0}".format(table)
+            )
+            op.execute(
+                "CREATE TRIGGER {0}_search_ai AFTER INSERT ON {0} BEGIN "
+                "INSERT INTO {0}_search (rowid, name, area) VALUES (new.id, new.name, new.city || ', ' || new.state); "
+                "END".format(table)
+            )
+            op.execute(
+                "CREATE TRIGGER {0}_search_ad AFTER DELETE ON {0} BEGIN "
+                "DELETE FROM {0}_search WHERE rowid = old.id; "
+                "END".format(table)
+            )
+            op.execute(
+                "CREATE TRIGGER {0}_search_au AFTER UPDATE OF name, city, state ON {0} BEGIN "
+                "UPDATE {0}_search SET name = new.name, area = new.city || ', ' || new.state WHERE rowid = new.id; "
+                "END".format(table)
+            )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table in TABLES:
+            op.execute('DROP INDEX IF EXISTS ix_{0}_area_trgm'.format(table))
+            op.execute('DROP INDEX IF EXISTS ix_{0}_name_trgm'.format(table))
+    elif dialect == 'sqlite':
+        for table in TABLES:
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute('DROP TRIGGER IF EXISTS {0}_search_{1}'.format(table, suffix))
+            op.execute('DROP TABLE IF EXISTS {0}_search'.format(table))
@@ -0,0 +1,39 @@
+"""updated_at on venues, artists and shows
+
+Revision ID: c5d82f1e7a39
+Revises: a47e2d90c1f6
+Create Date: 2026-10-18 16:12:05.883104
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d82f1e7a39'
+down_revision = 'a47e2d90c1f6'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venues', 'artists', 'shows')
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for table in TABLES:
+            op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True),
+                server_default=sa.func.now(), nullable=False))
+    else:
+        # SQLite can't add a column with a non-constant default: add it with a
+        # placeholder and stamp the existing rows.
+        for table in TABLES:
+            op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True),
+                server_default=sa.text("'1970-01-01 00:00:00'"), nullable=False))
+            op.execute('UPDATE %s SET updated_at = CURRENT_TIMESTAMP' % table)
+
+
+def downgrade():
+    # Plain DROP COLUMN (SQLite 3.35+): rebuilding the tables in a batch would
+    # lose the full-text search triggers on venues and artists.
+    for table in reversed(TABLES):
+        op.drop_column(table, 'updated_at')
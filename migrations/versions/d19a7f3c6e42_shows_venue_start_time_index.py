@@ -0,0 +1,24 @@
+"""index shows by (venue_id, start_time)
+
+Revision ID: d19a7f3c6e42
+Revises: b85d1e6f0a27
+Create Date: 2026-10-18 11:52:30.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd19a7f3c6e42'
+down_revision = 'b85d1e6f0a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
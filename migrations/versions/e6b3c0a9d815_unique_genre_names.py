@@ -0,0 +1,55 @@
+"""unique genre names
+
+Revision ID: e6b3c0a9d815
+Revises: d19a7f3c6e42
+Create Date: 2026-10-18 12:40:07.264915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b3c0a9d815'
+down_revision = 'd19a7f3c6e42'
+branch_labels = None
+depends_on = None
+
+genres = sa.table('genres', sa.column('id', sa.Integer), sa.column('name', sa.String))
+
+ASSOCIATIONS = (
+    sa.table('venue_genres', sa.column('venue_id', sa.Integer), sa.column('genre_id', sa.Integer)),
+    sa.table('artist_genres', sa.column('artist_id', sa.Integer), sa.column('genre_id', sa.Integer)),
+)
+
+
+def upgrade():
+    # Fold duplicate genre rows into the lowest id before enforcing uniqueness.
+    conn = op.get_bind()
+    canonical, duplicates = {}, {}
+    for genre_id, name in conn.execute(sa.select([genres.c.id, genres.c.name]).order_by(genres.c.id)):
+        if name in canonical:
+            duplicates[genre_id] = canonical[name]
+        else:
+            canonical[name] = genre_id
+
+    if duplicates:
+        for table in ASSOCIATIONS:
+            key = [c for c in table.c if c.name != 'genre_id'][0]
+            existing = {tuple(row) for row in conn.execute(sa.select([key, table.c.genre_id]))}
+            moved = set()
+            for entity_id, genre_id in existing:
+                if genre_id in duplicates:
+                    target = (entity_id, duplicates[genre_id])
+                    if target not in existing and target not in moved:
+                        moved.add(target)
+            conn.execute(table.delete().where(table.c.genre_id.in_(list(duplicates))))
+            if moved:
+                conn.execute(table.insert(), [{key.name: e, 'genre_id': g} for e, g in moved])
+        conn.execute(genres.delete().where(genres.c.id.in_(list(duplicates))))
+
+    op.create_index(op.f('ix_genres_name'), 'genres', ['name'], unique=True)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_genres_name'), table_name='genres')
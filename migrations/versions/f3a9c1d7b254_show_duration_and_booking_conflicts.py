@@ -0,0 +1,108 @@
+"""show end times, parsed artist availability and booking conflict checks
+
+Revision ID: f3a9c1d7b254
+Revises: e6b3c0a9d815
+Create Date: 2026-10-18 14:21:47.095316
+
+"""
+import time
+from datetime import timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9c1d7b254'
+down_revision = 'e6b3c0a9d815'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+DEFAULT_SHOW_MINUTES = 120
+
+shows = sa.table('shows',
+    sa.column('id', sa.Integer),
+    sa.column('venue_id', sa.Integer),
+    sa.column('artist_id', sa.Integer),
+    sa.column('start_time', sa.DateTime(timezone=True)),
+    sa.column('end_time', sa.DateTime(timezone=True))
+)
+
+artists = sa.table('artists',
+    sa.column('id', sa.Integer),
+    sa.column('available_time', sa.String),
+    sa.column('available_from', sa.Integer),
+    sa.column('available_until', sa.Integer)
+)
+
+
+def minutes(value):
+    parsed = time.strptime(value.strip(' '), '%H:%M')
+    return parsed.tm_hour * 60 + parsed.tm_min
+
+
+def execute_batched(conn, stmt, params):
+    for i in range(0, len(params), BATCH_SIZE):
+        conn.execute(stmt, params[i:i + BATCH_SIZE])
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    op.add_column('artists', sa.Column('available_from', sa.Integer(), nullable=True))
+    op.add_column('artists', sa.Column('available_until', sa.Integer(), nullable=True))
+    params = []
+    for artist_id, available_time in conn.execute(
+            sa.select([artists.c.id, artists.c.available_time]).where(artists.c.available_time != '')):
+        periods = (available_time or '').split('-')
+        try:
+            params.append({'artist_id': artist_id, 'available_from': minutes(periods[0]),
+                           'available_until': minutes(periods[1])})
+        except (IndexError, ValueError):
+            continue
+    execute_batched(conn, artists.update().where(artists.c.id == sa.bindparam('artist_id')).values(
+        available_from=sa.bindparam('available_from'), available_until=sa.bindparam('available_until')), params)
+
+    # Existing shows get the default length, cut short where the venue or the
+    # artist has a later show starting sooner, so no two existing bookings
+    # overlap when the constraints below are added.
+    op.add_column('shows', sa.Column('end_time', sa.DateTime(timezone=True), nullable=True))
+    rows = conn.execute(sa.select([shows.c.id, shows.c.venue_id, shows.c.artist_id, shows.c.start_time])
+        .order_by(shows.c.start_time.desc(), shows.c.id.desc())).fetchall()
+    next_start = {}
+    params = []
+    for show_id, venue_id, artist_id, start_time in rows:
+        end_time = start_time + timedelta(minutes=DEFAULT_SHOW_MINUTES)
+        for key in (('venue', venue_id), ('artist', artist_id)):
+            if key in next_start:
+                end_time = min(end_time, next_start[key])
+            next_start[key] = start_time
+        params.append({'show_id': show_id, 'end_time': end_time})
+    execute_batched(conn, shows.update().where(shows.c.id == sa.bindparam('show_id')).values(
+        end_time=sa.bindparam('end_time')), params)
+
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.alter_column('end_time', nullable=False, existing_type=sa.DateTime(timezone=True))
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'], unique=False)
+
+    if conn.dialect.name == 'postgresql':
+        # Enforced by the database, so concurrent bookings can't both succeed.
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        op.execute('ALTER TABLE shows ADD CONSTRAINT shows_venue_no_overlap '
+                   'EXCLUDE USING gist (venue_id WITH =, tstzrange(start_time, end_time) WITH &&)')
+        op.execute('ALTER TABLE shows ADD CONSTRAINT shows_artist_no_overlap '
+                   'EXCLUDE USING gist (artist_id WITH =, tstzrange(start_time, end_time) WITH &&)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('ALTER TABLE shows DROP CONSTRAINT shows_artist_no_overlap')
+        op.execute('ALTER TABLE shows DROP CONSTRAINT shows_venue_no_overlap')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    with op.batch_alter_table('shows') as batch_op:
+        batch_op.drop_column('end_time')
+    # Plain DROP COLUMN (SQLite 3.35+): rebuilding the table in a batch would
+    # lose the full-text search triggers on it.
+    op.drop_column('artists', 'available_until')
+    op.drop_column('artists', 'available_from')
@@ -0,0 +1,100 @@
+import random
+import threading
+import time
+import weakref
+
+from flask import g, has_request_context, request
+from flask import session as user_session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import exc, orm
+
+# Read-replica routing.
+#
+# REPLICA_BINDS names entries of SQLALCHEMY_BINDS that replicate the primary.
+# GET/HEAD requests, and the endpoints in READ_ONLY_ENDPOINTS, read from a
+# replica; flushes and every other request use the primary. Once a request
+# commits, that client's reads stick to the primary for REPLICA_STICKY_SECONDS
+# so they see their own writes despite replication lag. A replica that can't
+# be connected to is skipped for REPLICA_RETRY_SECONDS, falling back to the
+# other replicas and then to the primary. A replica that answered is trusted
+# for REPLICA_CHECK_SECONDS without connecting again; if it stops answering in
+# that window, the read that hit the failure is retried on the primary and the
+# replica is skipped as above. With no replicas nothing changes.
+
+# Health is tracked per engine, so apps with their own engines don't share it.
+_down_until = weakref.WeakKeyDictionary()
+_up_until = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def reads_from_replica(app):
+    if not app.config.get('REPLICA_BINDS') or not has_request_context():
+        return False
+    if request.method not in ('GET', 'HEAD') and request.endpoint not in app.config['READ_ONLY_ENDPOINTS']:
+        return False
+    return user_session.get('_primary_until', 0) <= time.time()
+
+
+def mark_down(app, engine):
+    with _lock:
+        _down_until[engine] = time.time() + app.config['REPLICA_RETRY_SECONDS']
+        _up_until.pop(engine, None)
+    app.logger.warning('Replica %r is unavailable, reading from the primary', engine.url)
+
+
+def pick_replica(app):
+    # A healthy replica engine, or None to use the primary.
+    db = get_state(app).db
+    now = time.time()
+    engines = [db.get_engine(app, bind=bind) for bind in app.config['REPLICA_BINDS']]
+    engines = [engine for engine in engines if _down_until.get(engine, 0) <= now]
+    random.shuffle(engines)
+    for engine in engines:
+        if _up_until.get(engine, 0) > now:
+            return engine
+        try:
+            engine.connect().close()
+        except exc.DBAPIError:
+            mark_down(app, engine)
+            continue
+        with _lock:
+            _up_until[engine] = now + app.config['REPLICA_CHECK_SECONDS']
+        return engine
+    return None
+
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and reads_from_replica(self.app):
+            # One replica per request, checked when it is first needed.
+            if '_replica' not in g:
+                g._replica = pick_replica(self.app)
+            if g._replica is not None:
+                return g._replica
+        return SignallingSession.get_bind(self, mapper, clause)
+
+    def _connection_for_bind(self, engine, execution_options=None, **kw):
+        try:
+            return SignallingSession._connection_for_bind(self, engine, execution_options, **kw)
+        except exc.DBAPIError:
+            if not has_request_context() or engine is not g.get('_replica'):
+                raise
+            # The replica failed after it was last checked: skip it and run
+            # this query, and the rest of the request, on the primary.
+            mark_down(self.app, engine)
+            g._replica = None
+            primary = SignallingSession.get_bind(self)
+            return SignallingSession._connection_for_bind(self, primary, execution_options, **kw)
+
+    def commit(self):
+        SignallingSession.commit(self)
+        if self.app.config.get('REPLICA_BINDS') and has_request_context():
+            user_session['_primary_until'] = time.time() + self.app.config['REPLICA_STICKY_SECONDS']
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
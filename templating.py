@@ -0,0 +1,81 @@
+import hashlib
+import os
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+# Template compilation and fragment caching.
+#
+# Compiled templates are written to JINJA_BYTECODE_CACHE_DIR, or when it is
+# unset to Jinja's per-user directory under the system temp dir, and reused
+# by every worker and across restarts; Jinja checks each entry against the
+# template source, so edited templates are recompiled. An empty setting
+# compiles in memory.
+#
+# {% cache key[, ttl] %} ... {% endcache %} stores the rendered block in the
+# fragment cache. The key is a value or tuple naming what the block renders;
+# include the updated_at of every row it shows, e.g.
+#
+#     {% cache ('venue', venue.id, venue.updated_at) %}
+#
+# Model writes (ORM changes and bulk UPDATEs alike) bump updated_at, so a
+# changed row gets a new key and its old fragment is never read again; it
+# ages out of the cache. Keys are scoped to the tag's template and line and
+# to the template version, so editing a template doesn't serve old markup.
+
+
+def template_version(app):
+    # Hash of every file under the template folder.
+    digest = hashlib.sha1()
+    folder = os.path.join(app.root_path, app.template_folder)
+    for root, dirs, files in sorted(os.walk(folder)):
+        dirs.sort()
+        for filename in sorted(files):
+            with open(os.path.join(root, filename), 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        Extension.__init__(self, environment)
+        environment.extend(fragment_cache=None, fragment_cache_prefix='fragment:')
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [nodes.Const('%s:%d' % (parser.name, lineno)), parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+
+    def _render(self, location, key, ttl, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        if not isinstance(key, (tuple, list)):
+            key = (key,)
+        key = self.environment.fragment_cache_prefix + ':'.join([location] + [str(part) for part in key])
+        html = cache.get(key)
+        if html is None:
+            html = caller()
+            cache.set(key, str(html), ttl)
+        return Markup(html)
+
+
+def init_templating(app, fragment_cache):
+    directory = app.config.get('JINJA_BYTECODE_CACHE_DIR')
+    if directory is None:
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+    elif directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = fragment_cache
+    app.extensions['template_version'] = template_version(app)
+    app.jinja_env.fragment_cache_prefix = 'fragment:%s:' % app.extensions['template_version'][:12]
@@ -0,0 +1,95 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app as fyyur  # noqa: E402
+from config import TestingConfig  # noqa: E402
+
+TABLES = ('venue_genres', 'artist_genres', 'shows', 'venues', 'artists', 'genres')
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    import flask_migrate
+
+    class Config(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path_factory.mktemp('db') / 'fyyur.db')
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        JINJA_BYTECODE_CACHE_DIR = ''
+        METRICS_ENABLED = False
+
+    app = fyyur.create_app(Config)
+    fyyur.init_migrate(app)
+    with app.app_context():
+        flask_migrate.upgrade(directory=os.path.join(ROOT, 'migrations'))
+    return app
+
+
+@pytest.fixture
+def db(app):
+    # An empty catalog and empty in-process caches for every test.
+    with app.app_context():
+        for table in TABLES:
+            fyyur.db.session.execute('DELETE FROM %s' % table)
+        fyyur.db.session.commit()
+        fyyur.clear_genre_registry()
+        fyyur.recently_listed_cache.clear()
+        app.extensions['detail_cache'].clear()
+        yield fyyur.db
+        fyyur.db.session.remove()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+
+@pytest.fixture
+def statements(app, db):
+    # Counts the SQL statements run while a request is handled; read .count.
+    class Counter(object):
+        count = 0
+
+    counter = Counter()
+
+    def count(*args):
+        counter.count += 1
+
+    engine = db.get_engine(app)
+    event.listen(engine, 'before_cursor_execute', count)
+    yield counter
+    event.remove(engine, 'before_cursor_execute', count)
+
+
+@pytest.fixture
+def catalog(db):
+    # make(venues, artists, shows) seeds a catalog with shows spread over
+    # the year around now, half of them upcoming; returns the venue, artist
+    # and show ids.
+    def make(venues=2, artists=2, shows=4):
+        genre = fyyur.Genre.query.filter_by(name='Jazz').first() or fyyur.Genre(name='Jazz')
+        venue_rows = [fyyur.Venue(name='Venue %d' % i, city='Lagos', state='Lagos', address='%d Main Street' % i,
+                                  genres=[genre]) for i in range(venues)]
+        artist_rows = [fyyur.Artist(name='Artist %d' % i, city='Ibadan', state='Oyo', genres=[genre])
+                       for i in range(artists)]
+        db.session.add_all(venue_rows + artist_rows)
+        db.session.flush()
+        now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        show_rows = []
+        for i in range(shows):
+            start = now + timedelta(days=i - shows // 2, hours=1)
+            show_rows.append(fyyur.Show(
+                venue_id=venue_rows[i % venues].id, artist_id=artist_rows[i % artists].id,
+                start_time=start, end_time=start + timedelta(hours=1), upcoming=start >= now))
+        db.session.add_all(show_rows)
+        db.session.flush()
+        fyyur.repair_show_counts()
+        db.session.commit()
+        return [v.id for v in venue_rows], [a.id for a in artist_rows], [s.id for s in show_rows]
+    return make
@@ -0,0 +1,57 @@
+import json
+import os
+import shutil
+import threading
+
+import assets
+from conftest import ROOT
+
+
+def static_copy(tmp_path):
+    folder = tmp_path / 'static'
+    shutil.copytree(os.path.join(ROOT, 'static'), str(folder), ignore=shutil.ignore_patterns(assets.DIST))
+    return str(folder)
+
+
+def read_manifest(folder):
+    with open(os.path.join(folder, assets.DIST, assets.MANIFEST)) as f:
+        return json.load(f)
+
+
+def test_concurrent_builds_never_expose_a_missing_file(tmp_path):
+    folder = static_copy(tmp_path)
+    assets.build(folder)
+    failures, done = [], threading.Event()
+
+    def read():
+        while not done.is_set():
+            try:
+                manifest = read_manifest(folder)
+                for name in ('css/app.css', 'js/app.js'):
+                    with open(os.path.join(folder, assets.DIST, manifest[name]), 'rb'):
+                        pass
+            except Exception as e:
+                failures.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    builders = [threading.Thread(target=assets.build, args=(folder,)) for _ in range(3)]
+    for thread in readers + builders:
+        thread.start()
+    for thread in builders:
+        thread.join()
+    done.set()
+    for thread in readers:
+        thread.join()
+    assert failures == []
+
+
+def test_prune_keeps_only_the_current_build(tmp_path):
+    folder = static_copy(tmp_path)
+    assets.build(folder)
+    with open(os.path.join(folder, 'css', 'main.css'), 'a') as f:
+        f.write('\n.pruned { color: red; }\n')
+    manifest = assets.build(folder)
+    assert assets.prune_dist(folder, manifest) > 0
+    assert assets.prune_dist(folder, manifest) == 0
+    for name in manifest.values():
+        assert os.path.isfile(os.path.join(folder, assets.DIST, name))
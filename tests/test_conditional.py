@@ -0,0 +1,32 @@
+import app as fyyur
+
+
+def delete_first_venue(db, venue_ids):
+    fyyur.Show.query.filter(fyyur.Show.venue_id == venue_ids[0]).delete(synchronize_session=False)
+    db.session.delete(fyyur.Venue.query.get(venue_ids[0]))
+    db.session.commit()
+
+
+def test_listings_revalidate_on_the_etag_alone(client, catalog):
+    catalog(venues=3)
+    response = client.get('/venues')
+    assert response.status_code == 200
+    assert response.headers.get('ETag')
+    assert 'Last-Modified' not in response.headers
+
+    again = client.get('/venues', headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_deleting_a_row_is_never_answered_with_a_stale_304(client, db, catalog):
+    venue_ids, _, _ = catalog(venues=3)
+    first = client.get('/venues')
+    delete_first_venue(db, venue_ids)
+
+    dated = client.get('/venues', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+    assert dated.status_code == 200
+    assert 'Venue 0' not in dated.get_data(as_text=True)
+
+    tagged = client.get('/venues', headers={'If-None-Match': first.headers['ETag']})
+    assert tagged.status_code == 200
+    assert tagged.headers['ETag'] != first.headers['ETag']
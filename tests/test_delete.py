@@ -0,0 +1,19 @@
+import app as fyyur
+
+
+def test_deleting_a_venue_removes_its_shows_and_their_counts(client, db, catalog):
+    venue_ids, artist_ids, _ = catalog(venues=2, artists=2, shows=4)
+    response = client.delete('/venues/%d' % venue_ids[0])
+    assert response.status_code == 200
+
+    db.session.remove()
+    assert fyyur.Venue.query.get(venue_ids[0]) is None
+    assert fyyur.Show.query.filter_by(venue_id=venue_ids[0]).count() == 0
+    artist = fyyur.Artist.query.get(artist_ids[0])
+    assert (artist.upcoming_shows_count, artist.past_shows_count) == (0, 0)
+    other = fyyur.Artist.query.get(artist_ids[1])
+    assert other.upcoming_shows_count + other.past_shows_count == 2
+
+
+def test_deleting_a_missing_venue_is_a_404(client, db):
+    assert client.delete('/venues/999').status_code == 404
@@ -0,0 +1,33 @@
+import pytest
+
+import app as fyyur
+from cache import LRUCache
+
+
+@pytest.fixture
+def lru(app, monkeypatch):
+    monkeypatch.setitem(app.extensions, 'detail_cache', LRUCache())
+    return app.extensions['detail_cache']
+
+
+def test_cached_pages_are_revalidated_against_the_database(client, db, catalog, lru):
+    venue_ids, _, _ = catalog()
+    path = '/venues/%d' % venue_ids[0]
+    assert 'Venue 0' in client.get(path).get_data(as_text=True)
+    assert lru.get('venue:%d' % venue_ids[0]) is not None
+
+    # A write from another process, which can't clear this process's cache.
+    fyyur.Venue.query.get(venue_ids[0]).name = 'Renamed Hall'
+    db.session.commit()
+
+    assert 'Renamed Hall' in client.get(path).get_data(as_text=True)
+
+
+def test_a_current_cached_page_is_served_without_rendering(client, catalog, lru, statements):
+    venue_ids, _, _ = catalog()
+    path = '/venues/%d' % venue_ids[0]
+    first = client.get(path)
+    statements.count = 0
+    again = client.get(path)
+    assert again.get_data() == first.get_data()
+    assert statements.count == 1
@@ -0,0 +1,46 @@
+import app as fyyur
+
+
+def run_import(app, tmp_path, kind, text, name='rows.csv'):
+    path = tmp_path / name
+    path.write_text(text)
+    rejects = tmp_path / 'rejects.jsonl'
+    result = app.test_cli_runner().invoke(args=['import', kind, str(path), '--rejects', str(rejects)])
+    assert result.exit_code == 0, result.output
+    return rejects.read_text().splitlines() if rejects.exists() else []
+
+
+def test_show_rows_need_a_start_time(app, db, catalog, tmp_path):
+    venues, artists, shows = catalog(venues=1, artists=1, shows=0)
+    rejected = run_import(app, tmp_path, 'shows', 'venue_id,artist_id,start_time\n'
+                          '%d,%d,\n%d,%d,   \n%d,%d,2031-05-01 20:00:00\n' % ((venues[0], artists[0]) * 3))
+    assert len(rejected) == 2
+    assert all('start_time' in line for line in rejected)
+    assert fyyur.Show.query.count() == 1
+
+
+def test_show_rows_without_the_column_are_rejected(app, db, catalog, tmp_path):
+    venues, artists, shows = catalog(venues=1, artists=1, shows=0)
+    rejected = run_import(app, tmp_path, 'shows', '{"venue_id": %d, "artist_id": %d}\n' % (venues[0], artists[0]),
+                          name='rows.jsonl')
+    assert len(rejected) == 1
+    assert fyyur.Show.query.count() == 0
+
+
+def test_venues_import(app, db, tmp_path):
+    rejected = run_import(app, tmp_path, 'venues', 'name,city,state,address,genres,facebook_link,website,seeking_talent\n'
+                          'Hall,Jos,Plateau,1 Rd,"Jazz, Blues",https://facebook.com/h,https://h.com,NO\n')
+    assert rejected == []
+    venue = fyyur.Venue.query.one()
+    assert sorted(genre.name for genre in venue.genres) == ['Blues', 'Jazz']
+
+
+def test_each_imported_row_keeps_its_own_genres(app, db, tmp_path):
+    links = 'https://facebook.com/a,https://a.com,NO'
+    rejected = run_import(app, tmp_path, 'artists', 'name,city,state,genres,facebook_link,website,seeking_venue\n'
+                          'Band,Jos,Plateau,Jazz,{0}\nBand,Jos,Plateau,Blues,{0}\nSolo,Kano,Kano,"Folk, Soul",{0}\n'
+                          .format(links))
+    assert rejected == []
+    genres = [(artist.name, sorted(genre.name for genre in artist.genres))
+              for artist in fyyur.Artist.query.order_by(fyyur.Artist.id)]
+    assert genres == [('Band', ['Jazz']), ('Band', ['Blues']), ('Solo', ['Folk', 'Soul'])]
@@ -0,0 +1,28 @@
+from logging import FileHandler
+
+import app as fyyur
+from config import TestingConfig
+
+
+def file_handlers(app):
+    return [handler for handler in app.logger.handlers if isinstance(handler, FileHandler)]
+
+
+def test_testing_apps_write_no_log_file(app):
+    assert file_handlers(app) == []
+
+
+def test_the_error_log_is_attached_once(tmp_path):
+    class Config(TestingConfig):
+        TESTING = False
+        ERROR_LOG = str(tmp_path / 'error.log')
+
+    first = fyyur.create_app(Config)
+    try:
+        fyyur.create_app(Config)
+        fyyur.create_app(Config)
+        assert [handler.baseFilename for handler in file_handlers(first)] == [Config.ERROR_LOG]
+    finally:
+        for handler in file_handlers(first):
+            first.logger.removeHandler(handler)
+            handler.close()
@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import app as fyyur
+import metrics
+from config import TestingConfig
+
+
+@pytest.fixture
+def metrics_app(app, db):
+    class Config(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = app.config['SQLALCHEMY_DATABASE_URI']
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        JINJA_BYTECODE_CACHE_DIR = ''
+        METRICS_ENABLED = True
+
+    return fyyur.create_app(Config)
+
+
+def statements_observed(endpoint):
+    # (requests, statements) recorded so far for GET `endpoint`.
+    for (name, method), (_, total, count) in metrics.DB_STATEMENTS._series.items():
+        if name.endswith(endpoint) and method == 'GET':
+            return count, total
+    return 0, 0
+
+
+def test_statements_run_while_streaming_are_recorded(metrics_app, catalog):
+    catalog()
+    before = statements_observed('api_venues')
+    response = metrics_app.test_client().get('/api/v1/venues')
+    assert response.get_data(as_text=True).startswith('{"data": [')
+    assert statements_observed('api_venues') == before
+    response.close()
+
+    requests, statements = statements_observed('api_venues')
+    assert requests == before[0] + 1
+    assert statements > before[1]
+
+
+def test_failed_statements_leave_no_start_time_behind(metrics_app):
+    with metrics_app.app_context():
+        connection = fyyur.db.engine.connect()
+        try:
+            with pytest.raises(OperationalError):
+                connection.execute('SELECT * FROM no_such_table')
+            assert not connection.info.get('_metrics_started')
+        finally:
+            connection.close()
@@ -0,0 +1,55 @@
+import re
+from datetime import datetime, timedelta, timezone
+
+import app as fyyur
+
+
+def add_shows(db, hours):
+    venue = fyyur.Venue(name='Hall', city='Lagos', state='Lagos')
+    artist = fyyur.Artist(name='Band', city='Lagos', state='Lagos')
+    db.session.add_all([venue, artist])
+    db.session.flush()
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    for hour in hours:
+        start = now + timedelta(hours=hour)
+        db.session.add(fyyur.Show(venue_id=venue.id, artist_id=artist.id, start_time=start,
+                                  end_time=start + timedelta(minutes=30), upcoming=hour > 0))
+    db.session.commit()
+
+
+def cursor(html, rel):
+    match = re.search(r'href="[^"]*[?&]%s=([^"&]+)' % rel, html)
+    return match and match.group(1)
+
+
+def shows_listed(html):
+    return html.count('tile-show')
+
+
+def test_shows_open_on_the_latest_past_shows_when_none_are_upcoming(client, db):
+    add_shows(db, [-hour for hour in range(1, 6)])
+    html = client.get('/shows?limit=2').get_data(as_text=True)
+    assert shows_listed(html) == 2
+    assert cursor(html, 'after') is None
+
+    seen = 2
+    before = cursor(html, 'before')
+    while before:
+        html = client.get('/shows?limit=2&before=' + before).get_data(as_text=True)
+        seen += shows_listed(html)
+        before = cursor(html, 'before')
+    assert seen == 5
+
+
+def test_earlier_shows_are_linked_from_the_upcoming_page(client, db):
+    add_shows(db, [-2, -1, 1, 2])
+    html = client.get('/shows').get_data(as_text=True)
+    assert shows_listed(html) == 2
+    html = client.get('/shows?before=' + cursor(html, 'before')).get_data(as_text=True)
+    assert shows_listed(html) == 2
+
+
+def test_no_shows_no_links(client, db):
+    html = client.get('/shows').get_data(as_text=True)
+    assert shows_listed(html) == 0
+    assert cursor(html, 'before') is None and cursor(html, 'after') is None
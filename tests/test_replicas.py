@@ -0,0 +1,92 @@
+import shutil
+import sqlite3
+
+import pytest
+from sqlalchemy import event
+
+import app as fyyur
+import replicas
+from config import TestingConfig
+
+
+@pytest.fixture
+def replica_app(app, db, catalog, tmp_path):
+    # A copy of the seeded test database serves as the replica. Its venues are
+    # renamed so each page shows which database it was read from.
+    venue_ids, _, _ = catalog(venues=2)
+    # Requests must open sessions of their own on the replica-aware app.
+    db.session.remove()
+    primary = app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):]
+    (tmp_path / 'replica').mkdir()
+    replica = str(tmp_path / 'replica' / 'fyyur.db')
+    shutil.copyfile(primary, replica)
+    with sqlite3.connect(replica) as connection:
+        connection.execute("UPDATE venues SET name = 'Replica ' || name")
+
+    class Config(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = app.config['SQLALCHEMY_DATABASE_URI']
+        SQLALCHEMY_BINDS = {'replica_1': 'sqlite:///' + replica}
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        REPLICA_BINDS = ['replica_1']
+        JINJA_BYTECODE_CACHE_DIR = ''
+        METRICS_ENABLED = False
+
+    replica_app = fyyur.create_app(Config)
+    replica_app.venue_ids = venue_ids
+    return replica_app
+
+
+def test_get_requests_read_from_the_replica(replica_app):
+    client = replica_app.test_client()
+    response = client.get('/venues/%d' % replica_app.venue_ids[0])
+    assert response.status_code == 200
+    assert b'Replica Venue 0' in response.data
+
+
+def test_reads_stick_to_the_primary_after_a_write(replica_app):
+    client = replica_app.test_client()
+    venue_id, other_id = replica_app.venue_ids
+    assert client.delete('/venues/%d' % other_id).status_code == 200
+
+    response = client.get('/venues/%d' % venue_id)
+    assert response.status_code == 200
+    assert b'Venue 0' in response.data
+    assert b'Replica Venue 0' not in response.data
+
+    # Other clients still read from the replica.
+    assert b'Replica Venue 0' in replica_app.test_client().get('/venues/%d' % venue_id).data
+
+
+def test_a_replica_that_dies_after_its_check_falls_back_to_the_primary(replica_app, tmp_path):
+    client = replica_app.test_client()
+    venue_id = replica_app.venue_ids[0]
+    assert b'Replica Venue 0' in client.get('/venues/%d' % venue_id).data
+
+    # Still trusted from the check above, but no longer reachable.
+    shutil.rmtree(str(tmp_path / 'replica'))
+    with replica_app.app_context():
+        engine = fyyur.db.get_engine(replica_app, bind='replica_1')
+        assert replicas._up_until[engine] > replicas.time.time()
+
+    response = client.get('/venues/%d' % venue_id)
+    assert response.status_code == 200
+    assert b'Venue 0' in response.data
+    assert b'Replica Venue 0' not in response.data
+    assert engine not in replicas._up_until
+    assert replicas._down_until[engine] > replicas.time.time()
+
+
+def test_a_healthy_replica_is_not_checked_on_every_read(replica_app, monkeypatch):
+    with replica_app.app_context():
+        engine = fyyur.db.get_engine(replica_app, bind='replica_1')
+        checks = []
+        event.listen(engine, 'engine_connect', lambda connection, branch: checks.append(1))
+
+        assert replicas.pick_replica(replica_app) is engine
+        assert replicas.pick_replica(replica_app) is engine
+        assert len(checks) == 1
+
+        now = replicas.time.time()
+        monkeypatch.setattr(replicas.time, 'time', lambda: now + replica_app.config['REPLICA_CHECK_SECONDS'] + 1)
+        assert replicas.pick_replica(replica_app) is engine
+        assert len(checks) == 2
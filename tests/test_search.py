@@ -0,0 +1,20 @@
+import pytest
+
+import app as fyyur
+
+
+@pytest.mark.parametrize('endpoint', ['/venues/search', '/artists/search'])
+def test_a_blank_search_term_matches_nothing(client, catalog, statements, endpoint):
+    catalog()
+    statements.count = 0
+    response = client.post(endpoint, data={'search_term': '   '})
+    assert response.status_code == 200
+    assert 'Enter a search keyword' in response.get_data(as_text=True)
+    assert statements.count == 0
+
+
+def test_search_results_ignore_surrounding_whitespace(app, catalog):
+    catalog()
+    by_name, by_area = fyyur.search_results(fyyur.Venue, '  Venue 1 ')
+    assert [row['name'] for row in by_name['data']] == ['Venue 1']
+    assert fyyur.search_results(fyyur.Venue, ' \t ') == [{"count": 0, "data": []}, {"count": 0, "data": []}]
@@ -0,0 +1,28 @@
+import time
+
+import pytest
+
+import app as fyyur
+
+
+@pytest.fixture
+def lagos(monkeypatch):
+    # Run the server in UTC+1 for the test; the datetime filter is memoized.
+    monkeypatch.setenv('TZ', 'Africa/Lagos')
+    time.tzset()
+    fyyur.format_datetime.cache_clear()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+    fyyur.format_datetime.cache_clear()
+
+
+def test_shows_are_displayed_at_the_time_they_were_entered(client, catalog, lagos):
+    venue_ids, artist_ids, _ = catalog(shows=0)
+    response = client.post('/shows/create', data={
+        'artist_id': artist_ids[0], 'venue_id': venue_ids[0], 'start_time': '2030-01-01 20:00:00', 'duration': 60})
+    assert 'Show was successfully listed!' in response.get_data(as_text=True)
+
+    assert fyyur.Show.query.one().start_time.hour == 19
+    for path in ('/shows', '/venues/%d' % venue_ids[0], '/artists/%d' % artist_ids[0]):
+        assert '2030 at 8:00PM' in client.get(path).get_data(as_text=True), path
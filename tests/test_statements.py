@@ -0,0 +1,38 @@
+import pytest
+
+# Statements per request for pages whose cost must not depend on the size of
+# the catalog. Keep in step with STATEMENT_BUDGETS in bench.py.
+BUDGETS = {
+    '/': 2,
+    '/venues': 3,
+    '/artists': 3,
+    '/shows': 2,
+    '/venues/{venue}': 4,
+    '/artists/{artist}': 4,
+}
+
+
+def statements_for(client, statements, path):
+    statements.count = 0
+    response = client.get(path)
+    assert response.status_code == 200
+    return statements.count
+
+
+@pytest.mark.parametrize('path', sorted(BUDGETS))
+def test_statements_do_not_grow_with_the_catalog(client, catalog, statements, path):
+    venues, artists, shows = catalog(venues=2, artists=2, shows=4)
+    small = statements_for(client, statements, path.format(venue=venues[0], artist=artists[0]))
+    venues, artists, shows = catalog(venues=30, artists=30, shows=120)
+    large = statements_for(client, statements, path.format(venue=venues[0], artist=artists[0]))
+    assert large == small
+    assert large <= BUDGETS[path]
+
+
+@pytest.mark.parametrize('endpoint', ['/venues/search', '/artists/search'])
+def test_search_is_one_statement(client, catalog, statements, endpoint):
+    catalog(venues=20, artists=20, shows=0)
+    statements.count = 0
+    response = client.post(endpoint, data={'search_term': 'lagos'})
+    assert response.status_code == 200
+    assert statements.count == 1
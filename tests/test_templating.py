@@ -0,0 +1,24 @@
+import os
+
+from flask import Flask
+from jinja2 import FileSystemBytecodeCache
+
+from conftest import ROOT
+from templating import init_templating
+
+
+def templating_app(**config):
+    app = Flask('app', root_path=ROOT)
+    app.config.update(config)
+    init_templating(app, None)
+    return app
+
+
+def test_compiled_templates_stay_out_of_the_source_tree():
+    cache = templating_app(JINJA_BYTECODE_CACHE_DIR=None).jinja_env.bytecode_cache
+    assert isinstance(cache, FileSystemBytecodeCache)
+    assert not os.path.abspath(cache.directory).startswith(ROOT + os.sep)
+
+
+def test_an_empty_directory_compiles_in_memory():
+    assert templating_app(JINJA_BYTECODE_CACHE_DIR='').jinja_env.bytecode_cache is None
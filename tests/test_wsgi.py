@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+CHECK = 'import wsgi; print(wsgi.app.debug, wsgi.app.config["SECRET_KEY"])'
+
+
+def load_wsgi(tmp_path, **env):
+    env = dict({k: v for k, v in os.environ.items() if k not in ('FYYUR_ENV', 'SECRET_KEY')},
+               PYTHONPATH=ROOT, **env)
+    return subprocess.run([sys.executable, '-c', CHECK], cwd=str(tmp_path), env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+
+def test_wsgi_defaults_to_production_and_needs_a_secret_key(tmp_path):
+    result = load_wsgi(tmp_path)
+    assert result.returncode != 0
+    assert 'SECRET_KEY is not set' in result.stderr
+
+
+def test_wsgi_production_profile(tmp_path):
+    result = load_wsgi(tmp_path, SECRET_KEY='s3cret')
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ['False', 's3cret']
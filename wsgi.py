@@ -0,0 +1,8 @@
+import os
+
+from app import create_app
+
+# WSGI entry point: `gunicorn -c gunicorn.conf.py` serves wsgi:app. It builds
+# the production profile unless FYYUR_ENV names another one, so a bare
+# `gunicorn wsgi:app` never runs with debug on or a development SECRET_KEY.
+app = create_app(os.environ.get('FYYUR_ENV', 'production'))